@@ -5,10 +5,21 @@ from dotenv import load_dotenv
 from db.database_manager import DatabaseManager
 from services.csv_process import CSVLoader
 from services.load_artciles import AIMSSyncService
+from services.input_watcher import InputWatcher
+from services.reconcile import AIMS_RECONCILE_INTERVAL_HOURS, AIMSReconciler
+from services.sync_pipeline import (
+    FILE_ERROR,
+    FILE_INVALID,
+    FILE_SYNC_FAILED,
+    FILE_SYNCED,
+    SyncPipeline,
+)
 from modules.lib import append_timestamp
 from pid import ensure_single_instance
 
 from modules.common.maintenance import MaintenanceManager
+from modules.common.metrics import CSV_FILES, LOOP_SECONDS, start_metrics_server
+from modules.common.profiling import write_timing_report
 from modules.common.common import set_logger
 
 
@@ -24,16 +35,46 @@ FAILED_DIR = os.path.join(BASE_DIR, os.getenv("CSV_FAILED_DIR", "failed"))
 
 # DB
 DB_PATH = os.getenv("DB_PATH", os.path.join(BASE_DIR, "db", "aims.db"))
-# default scan interval: 5 minutes (300 seconds)
+# Max wait for new files before running housekeeping again: 5 minutes (300 seconds).
+# New files are picked up as soon as they are written (see services/input_watcher.py).
 SCAN_INTERVAL = int(os.getenv("SCAN_INTERVAL", "300"))
 
 # Ensure directories exist
 for folder in [INPUT_DIR, ARCHIVED_DIR, FAILED_DIR, os.path.dirname(DB_PATH)]:
     os.makedirs(folder, exist_ok=True)
 
-# Ensure only one instance is running
 PID_FILE = os.path.join(BASE_DIR, "sync_daemon.pid")
-ensure_single_instance(PID_FILE)
+
+
+def finalize_csv(file_path: str, outcome: str, report: dict = None):
+    """
+    Archive a CSV whose articles were synced, move anything else to failed.
+    The timing report is written next to the moved file.
+    """
+    CSV_FILES.inc(outcome=outcome)
+    timestamped_filename = append_timestamp(os.path.basename(file_path))
+
+    if outcome == FILE_SYNCED:
+        # Only archive if sync succeeds
+        today_folder = os.path.join(ARCHIVED_DIR, time.strftime("%d%m%Y"))
+        os.makedirs(today_folder, exist_ok=True)
+        target_path = os.path.join(today_folder, timestamped_filename)
+        os.rename(file_path, target_path)
+        logger.info(f"CSV archived successfully: {target_path}")
+        write_timing_report(target_path, report)
+        return
+
+    reasons = {
+        FILE_SYNC_FAILED: "sync failure",
+        FILE_ERROR: "exception",
+        FILE_INVALID: "invalid data",
+    }
+    failed_path = os.path.join(FAILED_DIR, timestamped_filename)
+    os.rename(file_path, failed_path)
+    logger.warning(
+        f"CSV moved to failed folder due to {reasons.get(outcome, outcome)}: {failed_path}"
+    )
+    write_timing_report(failed_path, report)
 
 
 def run_sync_daemon():
@@ -46,79 +87,71 @@ def run_sync_daemon():
     aims_sync = AIMSSyncService(db=db, failed_dir=FAILED_DIR)
 
     maintenance = MaintenanceManager(archived_dir=ARCHIVED_DIR, zip_retention_days=60)
+    reconciler = AIMSReconciler(db, aims_sync.client)
+    next_reconcile = time.monotonic() + AIMS_RECONCILE_INTERVAL_HOURS * 3600
+    watcher = InputWatcher(INPUT_DIR)
+    # Parsing runs on this thread while a background thread uploads to AIMS
+    pipeline = SyncPipeline(csv_loader, aims_sync, on_file_done=finalize_csv)
+
+    metrics_server = start_metrics_server()
 
     try:
         while True:
+            work_start = time.perf_counter()
 
             # Run daily maintenance tasks
             maintenance.run_daily_tasks()
 
-            # Scan CSV files
-            csv_files = [f for f in os.listdir(INPUT_DIR) if f.lower().endswith(".csv")]
+            # Re-flag articles AIMS lost or holds differently (in the background), then upload them
+            if AIMS_RECONCILE_INTERVAL_HOURS and time.monotonic() >= next_reconcile:
+                if reconciler.start(on_flagged=pipeline.request_sync):
+                    next_reconcile = time.monotonic() + AIMS_RECONCILE_INTERVAL_HOURS * 3600
+
+            # Wait for CSV files (returns as soon as a file is completely written)
+            wait_start = time.perf_counter()
+            csv_files = watcher.wait(SCAN_INTERVAL)
+            wait_end = time.perf_counter()
+            LOOP_SECONDS.observe(wait_end - wait_start, phase="wait")
             if not csv_files:
                 logger.info("No new CSV files found.")
-
-            for filename in csv_files:
-                file_path = os.path.join(INPUT_DIR, filename)
-                logger.info(f"Processing CSV file: {filename}")
-
-                updated = csv_loader.process_csv(file_path)
-                timestamped_filename = append_timestamp(filename)
-
-                # Only attempt sync if CSV processing succeeded
-                if updated:
-                    try:
-                        logger.info(
-                            f"Syncing articles from CSV: {timestamped_filename}"
-                        )
-                        sync_success = aims_sync.sync_all_pending_articles()
-
-                        if sync_success:
-                            # Only archive if sync succeeds
-                            today_folder = os.path.join(
-                                ARCHIVED_DIR, time.strftime("%d%m%Y")
-                            )
-                            os.makedirs(today_folder, exist_ok=True)
-                            target_path = os.path.join(
-                                today_folder, timestamped_filename
-                            )
-                            os.rename(file_path, target_path)
-                            logger.info(f"CSV archived successfully: {target_path}")
-                        else:
-                            # Move to failed folder
-                            failed_path = os.path.join(FAILED_DIR, timestamped_filename)
-                            os.rename(file_path, failed_path)
-                            logger.warning(
-                                f"CSV moved to failed folder due to sync failure: {failed_path}"
-                            )
-
-                    except Exception as e:
-                        logger.error(f"Unexpected error during sync: {e}")
-                        failed_path = os.path.join(FAILED_DIR, timestamped_filename)
-                        os.rename(file_path, failed_path)
-                        logger.warning(
-                            f"CSV moved to failed folder due to exception: {failed_path}"
-                        )
-                else:
-                    # Move invalid CSV to failed folder
-                    failed_path = os.path.join(FAILED_DIR, timestamped_filename)
-                    os.rename(file_path, failed_path)
-                    logger.warning(
-                        f"CSV moved to failed folder due to invalid data: {failed_path}"
-                    )
-
-            logger.info(f"Sleeping for {SCAN_INTERVAL} seconds before next check...")
-            time.sleep(SCAN_INTERVAL)
+                # Idle: re-export the catalog snapshots of stores changed by earlier files
+                csv_loader.save_snapshots()
+
+            # Ingest every queued file (oldest first), then sync them together
+            file_paths = [
+                os.path.join(INPUT_DIR, filename)
+                for filename in csv_files
+                if not pipeline.is_in_flight(os.path.join(INPUT_DIR, filename))
+            ]
+            if file_paths:
+                # Blocks only while the upload queue is full
+                pipeline.submit_files(file_paths)
+
+            LOOP_SECONDS.observe(
+                (wait_start - work_start) + (time.perf_counter() - wait_end), phase="work"
+            )
 
     except KeyboardInterrupt:
         logger.info("Daemon interrupted by user. Exiting...")
     except Exception as e:
         logger.error(f"Daemon stopped unexpectedly: {e}")
     finally:
+        # Before the pipeline: a finished reconciliation queues a sync
+        reconciler.close(timeout=60)
+        pipeline.close(timeout=60)
+        csv_loader.save_snapshots()
+        aims_sync.close()
+        if metrics_server:
+            metrics_server.shutdown()
+        watcher.close()
+        db.close()
         if os.path.exists(PID_FILE):
             os.remove(PID_FILE)
             logger.info(f"PID file {PID_FILE} removed on exit.")
 
 
 if __name__ == "__main__":
+    # Ensure only one instance is running (not at import: CSV parse workers
+    # are spawned processes that re-import this module)
+    ensure_single_instance(PID_FILE)
     run_sync_daemon()
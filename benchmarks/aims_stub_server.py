@@ -0,0 +1,327 @@
+"""
+Local fake of the AIMS SaaS endpoints used by AIMSSaaSAPIClient, with
+configurable latency and error rate (token requests never fail). Issued
+access tokens expire after token_lifetime seconds; requests with unknown or
+expired tokens get 401. Use it in benchmarks or to exercise the client
+without a real tenant:
+
+    with AIMSStubServer(latency=0.05) as stub:
+        client = AIMSSaaSAPIClient(base_url=stub.url)
+        result = client.add_articles("KL001", articles)
+
+Standalone: python benchmarks/aims_stub_server.py --port 8089 --latency 0.1
+"""
+
+import ssl
+import gzip
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "AIMSStub/1.0"
+    # headers and body are written separately; avoid Nagle/delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return body
+
+    def _simulate(self, path, can_fail=True):
+        """Apply latency and random failures. Returns True if the request failed."""
+        stub = self.server.stub
+        stub.count(self.command, path)
+        if stub.latency:
+            time.sleep(stub.latency)
+        if can_fail and stub.error_rate and stub.random() < stub.error_rate:
+            stub.count("ERROR", path)
+            self._send_json(500, {"responseCode": "500", "responseMessage": "stub error"})
+            return True
+        return False
+
+    def _authorized(self, path):
+        """Send 401 unless the request carries a valid access token."""
+        token = (self.headers.get("Authorization") or "").removeprefix("Bearer ")
+        if self.server.stub.token_valid(token):
+            return True
+        self.server.stub.count("UNAUTHORIZED", path)
+        self._send_json(401, {"responseCode": "401", "responseMessage": "invalid token"})
+        return False
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self._read_body()
+        stub = self.server.stub
+        if url.path.endswith("/api/v2/token/refresh"):
+            if self._simulate(url.path, can_fail=False):
+                return
+            refresh_token = json.loads(body or b"{}").get("refreshToken")
+            if not stub.use_refresh_token(refresh_token):
+                self._send_json(401, {"responseCode": "401", "responseMessage": "invalid refresh token"})
+                return
+            self._send_json(200, {"responseCode": "200", "responseMessage": stub.issue_token()})
+        elif url.path.endswith("/api/v2/token"):
+            if self._simulate(url.path, can_fail=False):
+                return
+            self._send_json(200, {"responseCode": "200", "responseMessage": stub.issue_token()})
+        else:
+            self._send_json(404, {"responseMessage": "not found"})
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        body = self._read_body()
+        if not url.path.endswith("/api/v2/common/articles"):
+            self._send_json(404, {"responseMessage": "not found"})
+            return
+        if self._simulate(url.path) or not self._authorized(url.path):
+            return
+        max_body = self.server.stub.max_body_bytes
+        if max_body and len(body) > max_body:
+            self._send_json(413, {"responseCode": "413", "responseMessage": "too large"})
+            return
+        store = parse_qs(url.query).get("store", [""])[0]
+        articles = json.loads(body or b"[]")
+        self.server.stub.store_articles(store, articles)
+        self._send_json(200, {"responseCode": "200", "responseMessage": "SUCCESS"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith("/api/v2/common/articles"):
+            if self._simulate(url.path) or not self._authorized(url.path):
+                return
+            query = parse_qs(url.query)
+            self._send_json(
+                200,
+                self.server.stub.list_articles(
+                    query.get("store", [""])[0],
+                    int(query.get("page", ["0"])[0]),
+                    int(query.get("size", ["1000"])[0]),
+                ),
+            )
+            return
+        if not url.path.endswith("/api/v1/articles/article"):
+            self._send_json(404, {"responseMessage": "not found"})
+            return
+        if self._simulate(url.path) or not self._authorized(url.path):
+            return
+        query = parse_qs(url.query)
+        store = query.get("stationCode", [""])[0]
+        article_id = query.get("articleId", [""])[0]
+        article = self.server.stub.articles.get(store, {}).get(article_id)
+        if article is None:
+            self._send_json(404, {"responseMessage": f"Article {article_id} not found"})
+        else:
+            self._send_json(200, {"responseMessage": "SUCCESS", "articleList": [article]})
+
+
+class StubState:
+    """
+    Tokens, stored articles, request counts and failure simulation shared by
+    the stub front ends (this threaded one and benchmarks/async_stub_server.py).
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        error_rate=0.0,
+        seed=None,
+        max_body_bytes=0,
+        keep_articles=True,
+        token_lifetime=3600,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        # Reject article uploads larger than this with 413 (0 = unlimited)
+        self.max_body_bytes = max_body_bytes
+        # False: only count received articles (large benchmark runs)
+        self.keep_articles = keep_articles
+        self.received_articles = 0
+        # Seconds an issued access token is valid (expires_in)
+        self.token_lifetime = token_lifetime
+        self._tokens = {}
+        self._refresh_tokens = set()
+        self._token_serial = 0
+        self.requests = Counter()
+        self.articles = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def random(self):
+        with self._lock:
+            return self._random.random()
+
+    def count(self, method, path):
+        with self._lock:
+            self.requests[f"{method} {path}"] += 1
+
+    def issue_token(self):
+        """New access / refresh token pair as returned by the token endpoints."""
+        with self._lock:
+            self._token_serial += 1
+            access_token = f"stub-access-{self._token_serial}"
+            refresh_token = f"stub-refresh-{self._token_serial}"
+            self._tokens[access_token] = time.time() + self.token_lifetime
+            self._refresh_tokens.add(refresh_token)
+        return {
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "token_type": "Bearer",
+            "expires_in": self.token_lifetime,
+        }
+
+    def use_refresh_token(self, refresh_token):
+        """Consume a refresh token (single use). False if unknown."""
+        with self._lock:
+            if refresh_token not in self._refresh_tokens:
+                return False
+            self._refresh_tokens.discard(refresh_token)
+            return True
+
+    def token_valid(self, token):
+        with self._lock:
+            return time.time() < self._tokens.get(token, 0)
+
+    def revoke_tokens(self):
+        """Invalidate all issued access and refresh tokens (next requests get 401)."""
+        with self._lock:
+            self._tokens.clear()
+            self._refresh_tokens.clear()
+
+    def store_articles(self, store, articles):
+        with self._lock:
+            self.received_articles += len(articles)
+            if not self.keep_articles:
+                return
+            stored = self.articles.setdefault(store, {})
+            for article in articles:
+                stored[article.get("articleId")] = article
+
+    def list_articles(self, store, page, size):
+        """Listing response for one page of a store's articles, ordered by articleId."""
+        with self._lock:
+            stored = self.articles.get(store, {})
+            ids = sorted(stored)[page * size:(page + 1) * size]
+            articles = [stored[article_id] for article_id in ids]
+            total = len(stored)
+        return {
+            "responseCode": "200",
+            "responseMessage": "SUCCESS",
+            "articleList": articles,
+            "totalElements": total,
+            "totalPages": -(-total // size) if size else 0,
+        }
+
+
+class AIMSStubServer(StubState):
+    """
+    Threaded local AIMS SaaS stub. Use as a context manager or start()/stop().
+    Pass certfile/keyfile to serve HTTPS.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        error_rate=0.0,
+        seed=None,
+        certfile=None,
+        keyfile=None,
+        max_body_bytes=0,
+        keep_articles=True,
+        token_lifetime=3600,
+    ):
+        StubState.__init__(
+            self, latency, error_rate, seed, max_body_bytes, keep_articles, token_lifetime
+        )
+        self._httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+        self.scheme = "http"
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self._httpd.socket = context.wrap_socket(
+                self._httpd.socket, server_side=True
+            )
+            self.scheme = "https"
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"{self.scheme}://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="aims-stub", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local AIMS SaaS stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="0.0 - 1.0")
+    parser.add_argument("--max-body-bytes", type=int, default=0, help="413 above this size")
+    parser.add_argument("--token-lifetime", type=int, default=3600, help="access token expires_in")
+    parser.add_argument("--certfile", help="serve HTTPS with this certificate")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args()
+
+    stub = AIMSStubServer(
+        args.host,
+        args.port,
+        args.latency,
+        args.error_rate,
+        certfile=args.certfile,
+        keyfile=args.keyfile,
+        max_body_bytes=args.max_body_bytes,
+        token_lifetime=args.token_lifetime,
+    )
+    print(f"AIMS stub listening on {stub.url} (set AIMS_SAAS_URL to this)")
+    try:
+        stub._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub._httpd.server_close()
+        print(dict(stub.requests))
+
+
+if __name__ == "__main__":
+    main()
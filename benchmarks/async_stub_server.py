@@ -0,0 +1,135 @@
+"""
+asyncio (aiohttp.web) version of the AIMS SaaS stub. Same endpoints, tokens
+and failure simulation as AIMSStubServer, but latency is an asyncio.sleep,
+so thousands of concurrent requests need no threads:
+
+    with AsyncAIMSStubServer(latency=0.05) as stub:
+        client = AsyncAIMSSaaSAPIClient(base_url=stub.url)
+
+The server runs its own event loop in a background thread. Needs aiohttp.
+"""
+
+import json
+import asyncio
+import threading
+
+from aiohttp import web
+
+from benchmarks.aims_stub_server import StubState
+
+
+def _json(status, payload):
+    return web.json_response(payload, status=status)
+
+
+class AsyncAIMSStubServer(StubState):
+    """Local AIMS SaaS stub on aiohttp. Use as a context manager or start()/stop()."""
+
+    def __init__(self, host="127.0.0.1", port=0, **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = port
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def _simulate(self, request, can_fail=True):
+        """Apply latency and random failures. Returns an error response or None."""
+        self.count(request.method, request.path)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if can_fail and self.error_rate and self.random() < self.error_rate:
+            self.count("ERROR", request.path)
+            return _json(500, {"responseCode": "500", "responseMessage": "stub error"})
+        return None
+
+    def _unauthorized(self, request):
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if self.token_valid(token):
+            return None
+        self.count("UNAUTHORIZED", request.path)
+        return _json(401, {"responseCode": "401", "responseMessage": "invalid token"})
+
+    async def _token(self, request):
+        await request.read()
+        await self._simulate(request, can_fail=False)
+        return _json(200, {"responseCode": "200", "responseMessage": self.issue_token()})
+
+    async def _refresh_token(self, request):
+        body = await request.read()
+        await self._simulate(request, can_fail=False)
+        if not self.use_refresh_token(json.loads(body or b"{}").get("refreshToken")):
+            return _json(401, {"responseCode": "401", "responseMessage": "invalid refresh token"})
+        return _json(200, {"responseCode": "200", "responseMessage": self.issue_token()})
+
+    async def _put_articles(self, request):
+        # aiohttp decompresses gzip request bodies itself
+        body = await request.read()
+        error = await self._simulate(request) or self._unauthorized(request)
+        if error:
+            return error
+        if self.max_body_bytes and len(body) > self.max_body_bytes:
+            return _json(413, {"responseCode": "413", "responseMessage": "too large"})
+        self.store_articles(request.query.get("store", ""), json.loads(body or b"[]"))
+        return _json(200, {"responseCode": "200", "responseMessage": "SUCCESS"})
+
+    async def _get_article(self, request):
+        error = await self._simulate(request) or self._unauthorized(request)
+        if error:
+            return error
+        store = request.query.get("stationCode", "")
+        article_id = request.query.get("articleId", "")
+        article = self.articles.get(store, {}).get(article_id)
+        if article is None:
+            return _json(404, {"responseMessage": f"Article {article_id} not found"})
+        return _json(200, {"responseMessage": "SUCCESS", "articleList": [article]})
+
+    async def _list_articles(self, request):
+        error = await self._simulate(request) or self._unauthorized(request)
+        if error:
+            return error
+        query = request.query
+        return _json(
+            200,
+            self.list_articles(query.get("store", ""), int(query.get("page", 0)), int(query.get("size", 1000))),
+        )
+
+    async def _serve(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.add_routes(
+            [
+                web.post("/api/v2/token", self._token),
+                web.post("/api/v2/token/refresh", self._refresh_token),
+                web.put("/api/v2/common/articles", self._put_articles),
+                web.get("/api/v2/common/articles", self._list_articles),
+                web.get("/api/v1/articles/article", self._get_article),
+            ]
+        )
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port, backlog=4096)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="aims-async-stub", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._serve(), self._loop).result()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
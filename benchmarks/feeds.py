@@ -0,0 +1,53 @@
+"""
+Deterministic synthetic article feeds for benchmarks. The same (rows, seed,
+change_ratio, version) always produces the same file, so results stay
+comparable across commits.
+"""
+
+import random
+
+HEADER = [
+    "ArtikelNr",
+    "Bezeichnung",
+    "VKNetto1",
+    "VKBrutto1",
+    "EAN1",
+    "Warengruppe",
+    "Lieferant",
+    "Einheit",
+]
+
+_GROUPS = ["Getraenke", "Snacks", "Tiefkuehl", "Konserven", "Drogerie", "Haushalt"]
+_UNITS = ["Stk", "kg", "l", "Pkg"]
+
+
+def _is_changed(index: int, change_ratio: float) -> bool:
+    """Stable pseudo-random selection of changed rows (Knuth multiplicative hash)."""
+    return (index * 2654435761) % 2**32 < change_ratio * 2**32
+
+
+def write_feed(path: str, rows: int, seed: int = 42, change_ratio: float = 0.0, version: int = 1):
+    """
+    Write a semicolon-delimited feed of `rows` articles. A fraction
+    change_ratio of the articles gets prices bumped by `version` cents
+    compared to the base feed (change_ratio=0); the rest is identical.
+    Returns the number of changed rows.
+    """
+    rnd = random.Random(seed)
+    changed = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(";".join(HEADER) + "\r\n")
+        for i in range(rows):
+            cents = rnd.randint(10, 99999)
+            group = rnd.choice(_GROUPS)
+            unit = rnd.choice(_UNITS)
+            ean = f"{4000000000000 + rnd.randint(0, 999999999):013d}"
+            if change_ratio and _is_changed(i, change_ratio):
+                cents += version
+                changed += 1
+            net = f"{cents / 100:.2f}".replace(".", ",")
+            gross = f"{cents * 1.19 / 100:.2f}".replace(".", ",")
+            f.write(
+                f"A{i:08d};Artikel {i} {group};{net};{gross};{ean};{group};L{i % 97:03d};{unit}\r\n"
+            )
+    return changed
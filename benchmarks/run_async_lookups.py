@@ -0,0 +1,159 @@
+"""
+Validate AsyncAIMSSaaSAPIClient against the asyncio AIMS stub: upload a set
+of articles, then look them up with thousands of concurrent get_article
+calls (a few for missing articles, which must fail with 404). Checks every
+answer, that one token was requested and reports lookups/s and latency.
+Optionally runs the same lookups with the blocking client in a thread pool.
+
+    python benchmarks/run_async_lookups.py --lookups 5000 --concurrency 500 --latency 0.05
+
+Exits 1 if any lookup returned a wrong result. Needs aiohttp.
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+from requests.exceptions import HTTPError
+
+from benchmarks.async_stub_server import AsyncAIMSStubServer
+from modules.aims_saas.aims_saas_api_client import AIMSSaaSAPIClient
+from modules.aims_saas.async_client import AsyncAIMSSaaSAPIClient
+
+STORE = "BENCH01"
+
+
+def make_articles(count: int) -> list:
+    return [
+        {
+            "store": STORE,
+            "articleId": f"A{i:08d}",
+            "articleName": f"Artikel {i}",
+            "eans": [],
+            "data": {"STORE_ID": STORE, "ArtikelNr": f"A{i:08d}", "VKNetto1": f"{i % 1000},99"},
+        }
+        for i in range(count)
+    ]
+
+
+def make_lookups(articles: int, lookups: int, missing_ratio: float, seed: int) -> list:
+    rnd = random.Random(seed)
+    return [
+        f"MISSING{i}" if rnd.random() < missing_ratio else f"A{rnd.randrange(articles):08d}"
+        for i in range(lookups)
+    ]
+
+
+def check(article_id: str, response) -> bool:
+    """True if a lookup answer (article list or exception) is the expected one."""
+    if article_id.startswith("MISSING"):
+        return getattr(response, "status", None) == 404 or (
+            isinstance(response, HTTPError) and response.response.status_code == 404
+        )
+    if isinstance(response, BaseException):
+        return False
+    found = response.get("articleList") or [{}]
+    return found[0].get("articleId") == article_id
+
+
+def report(label: str, elapsed: float, latencies: list, errors: int, count: int):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(
+        f"{label:<6} {count} lookups in {elapsed:.2f} s = {count / elapsed:,.0f}/s, "
+        f"latency p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, "
+        f"{errors} wrong"
+    )
+
+
+async def run_async(url: str, articles: list, lookups: list, concurrency: int):
+    latencies = []
+
+    async def timed_lookup(client, article_id):
+        start = time.perf_counter()
+        try:
+            return await client.get_article(STORE, article_id)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    async with AsyncAIMSSaaSAPIClient(base_url=url, max_concurrency=concurrency) as client:
+        upload = await client.add_articles(STORE, articles)
+        if not upload.ok:
+            raise RuntimeError(f"Upload failed: {upload.text}")
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *(timed_lookup(client, article_id) for article_id in lookups), return_exceptions=True
+        )
+        elapsed = time.perf_counter() - start
+    unexpected = [r for r in responses if isinstance(r, Exception) and not isinstance(r, aiohttp.ClientResponseError)]
+    if unexpected:
+        print(f"First unexpected error: {unexpected[0]!r}")
+    errors = sum(not check(a, r) for a, r in zip(lookups, responses))
+    return elapsed, latencies, errors
+
+
+def run_sync(url: str, lookups: list, workers: int):
+    client = AIMSSaaSAPIClient(base_url=url)
+    latencies = []
+
+    def lookup(article_id):
+        start = time.perf_counter()
+        try:
+            return client.get_article(STORE, article_id)
+        except Exception as e:
+            return e
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            responses = list(pool.map(lookup, lookups))
+        elapsed = time.perf_counter() - start
+    finally:
+        client.close()
+    errors = sum(not check(a, r) for a, r in zip(lookups, responses))
+    return elapsed, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--articles", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=500, help="async client max_concurrency")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub seconds per request")
+    parser.add_argument("--missing-ratio", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sync-workers", type=int, default=0, help="also run the blocking client with N threads")
+    args = parser.parse_args()
+
+    articles = make_articles(args.articles)
+    lookups = make_lookups(args.articles, args.lookups, args.missing_ratio, args.seed)
+    wrong = 0
+    with AsyncAIMSStubServer(latency=args.latency, seed=args.seed) as stub:
+        elapsed, latencies, errors = asyncio.run(run_async(stub.url, articles, lookups, args.concurrency))
+        report("async", elapsed, latencies, errors, len(lookups))
+        wrong += errors
+        tokens = stub.requests["POST /api/v2/token"]
+        print(f"Token requests: {tokens}, stub requests: {dict(stub.requests)}")
+        if tokens != 1:
+            print("Expected exactly one token request")
+            wrong += 1
+
+        if args.sync_workers:
+            elapsed, latencies, errors = run_sync(stub.url, lookups, args.sync_workers)
+            report("sync", elapsed, latencies, errors, len(lookups))
+            wrong += errors
+    sys.exit(1 if wrong else 0)
+
+
+if __name__ == "__main__":
+    main()
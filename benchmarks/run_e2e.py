@@ -0,0 +1,258 @@
+"""
+End-to-end benchmark: synthetic feeds through the real CSVLoader, SyncPipeline
+and AIMSSyncService against the local AIMS stub.
+
+For every feed size it runs these phases on one SQLite DB:
+  initial      all articles new, everything is uploaded
+  delta_<r>    a fraction r of the articles changed (one phase per ratio)
+  unchanged    the last feed again, nothing to upload
+
+Each phase runs in a fresh interpreter, so peak RSS is per phase and module
+level env config applies. The stub runs in this process. Feeds are
+deterministic, so runs on different commits are comparable:
+
+    python benchmarks/run_e2e.py --sizes 10000 100000 --output before.json
+    python benchmarks/run_e2e.py --sizes 10000 100000 --baseline before.json
+
+With --baseline, throughput drops or memory growth above --tolerance exit 1.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.aims_stub_server import AIMSStubServer
+from benchmarks.feeds import write_feed
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_child(db_path: str, feed_path: str):
+    """Process one feed like the daemon does and print the result as JSON."""
+    from db.database_manager import DatabaseManager
+    from services.csv_process import CSVLoader
+    from services.load_artciles import AIMSSyncService
+    from services.sync_pipeline import SyncPipeline
+
+    work_dir = os.path.dirname(db_path)
+    db = DatabaseManager(db_path)
+    loader = CSVLoader(db, work_dir, work_dir, work_dir)
+    aims_sync = AIMSSyncService(db=db, failed_dir=work_dir)
+
+    done = threading.Event()
+    result = {}
+
+    def on_file_done(file_path, outcome, report=None):
+        result.update(outcome=outcome, report=report or {})
+        done.set()
+
+    pipeline = SyncPipeline(loader, aims_sync, on_file_done=on_file_done)
+    start = time.perf_counter()
+    pipeline.submit(feed_path)
+    done.wait()
+    elapsed = time.perf_counter() - start
+    pipeline.close()
+    pending = db.count_pending_for_aims()
+    aims_sync.close()
+    db.close()
+
+    metrics = loader.last_metrics
+    ingest = result["report"].get("ingest", {})
+    sync = result["report"].get("sync") or {}
+    print(
+        json.dumps(
+            {
+                "outcome": result["outcome"],
+                "rows": metrics.get("rows", 0),
+                "changed": metrics.get("inserted", 0) + metrics.get("updated", 0),
+                "seconds": round(elapsed, 3),
+                "rows_per_sec": round(metrics.get("rows", 0) / elapsed) if elapsed else None,
+                "ingest_seconds": ingest.get("wall_seconds"),
+                "sync_seconds": sync.get("wall_seconds"),
+                "pending_after": pending,
+                "peak_rss_mb": peak_rss_mb(),
+            }
+        )
+    )
+
+
+def run_phase(args, phase: str, db_path: str, feed_path: str) -> dict:
+    with AIMSStubServer(
+        latency=args.latency, error_rate=args.error_rate, seed=args.seed, keep_articles=False
+    ) as stub:
+        env = dict(
+            os.environ,
+            AIMS_SAAS_URL=stub.url,
+            AIMS_SAAS_USERNAME="bench",
+            AIMS_SAAS_PASSWORD="bench",
+            LOG_LEVEL="WARNING",
+            PYTHONPATH=REPO_ROOT,
+        )
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", db_path, feed_path],
+            cwd=os.path.dirname(db_path),
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"{phase} failed:\n{proc.stderr[-4000:]}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        result.update(
+            phase=phase,
+            put_requests=stub.requests["PUT /api/v2/common/articles"],
+            token_requests=stub.requests["POST /api/v2/token"],
+            stub_errors=sum(n for key, n in stub.requests.items() if key.startswith("ERROR")),
+            uploaded_articles=stub.received_articles,
+        )
+        return result
+
+
+def run_size(args, size: int, base_dir: str) -> list:
+    work_dir = os.path.join(base_dir, f"rows_{size}")
+    os.makedirs(work_dir)
+    db_path = os.path.join(work_dir, "bench.db")
+    results = []
+
+    feed = os.path.join(work_dir, "initial.csv")
+    write_feed(feed, size, seed=args.seed)
+    results.append(run_phase(args, "initial", db_path, feed))
+
+    # Ascending ratios: each delta changes exactly `ratio` of the articles
+    for version, ratio in enumerate(sorted(args.change_ratios), start=1):
+        feed = os.path.join(work_dir, f"delta_{ratio}.csv")
+        write_feed(feed, size, seed=args.seed, change_ratio=ratio, version=version)
+        results.append(run_phase(args, f"delta_{ratio}", db_path, feed))
+
+    results.append(run_phase(args, "unchanged", db_path, feed))
+    for result in results:
+        result["size"] = size
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: list):
+    print(
+        f"{'size':>9} {'phase':<12} {'rows/s':>10} {'seconds':>8} {'changed':>9} "
+        f"{'uploaded':>9} {'PUTs':>6} {'tokens':>6} {'errors':>6} {'peak MiB':>9}"
+    )
+    for r in results:
+        print(
+            f"{r['size']:>9} {r['phase']:<12} {r['rows_per_sec'] or 0:>10,} {r['seconds']:>8.2f} "
+            f"{r['changed']:>9} {r['uploaded_articles']:>9} {r['put_requests']:>6} "
+            f"{r['token_requests']:>6} {r['stub_errors']:>6} {r['peak_rss_mb'] or 0:>9}"
+        )
+
+
+def compare(results: list, baseline_path: str, tolerance: float) -> bool:
+    """Print changes against a baseline run; False if anything regressed beyond tolerance."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["size"], r["phase"]): r for r in baseline["results"]}
+    print(f"\nCompared to {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    ok = True
+    for r in results:
+        before = previous.get((r["size"], r["phase"]))
+        if not before:
+            continue
+        notes = []
+        if before.get("rows_per_sec") and r.get("rows_per_sec"):
+            change = r["rows_per_sec"] / before["rows_per_sec"] - 1
+            notes.append(f"rows/s {change:+.1%}")
+            if change < -tolerance:
+                ok = False
+                notes[-1] += " REGRESSION"
+        if before.get("peak_rss_mb") and r.get("peak_rss_mb"):
+            change = r["peak_rss_mb"] / before["peak_rss_mb"] - 1
+            notes.append(f"peak RSS {change:+.1%}")
+            if change > tolerance:
+                ok = False
+                notes[-1] += " REGRESSION"
+        if r["put_requests"] != before.get("put_requests"):
+            notes.append(f"PUTs {before.get('put_requests')} -> {r['put_requests']}")
+        print(f"{r['size']:>9} {r['phase']:<12} " + ", ".join(notes))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--change-ratios", type=float, nargs="+", default=[0.01, 0.1])
+    parser.add_argument("--latency", type=float, default=0.05, help="stub seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stub failure rate 0.0 - 1.0")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare with a JSON file written by --output")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed regression (0.1 = 10%%)")
+    parser.add_argument("--keep", help="keep feeds and DBs in this directory")
+    parser.add_argument("--child", nargs=2, metavar=("DB", "FEED"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    base_dir = args.keep or tempfile.mkdtemp(prefix="aims_bench_")
+    os.makedirs(base_dir, exist_ok=True)
+    results = []
+    try:
+        for size in args.sizes:
+            results.extend(run_size(args, size, base_dir))
+    finally:
+        if not args.keep:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    print_results(results)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline and not compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,32 @@
 import os
 import sqlite3
+import threading
+from contextlib import contextmanager
+from time import perf_counter
 from modules.common.common import set_logger
+from modules.common.metrics import DB_UPSERT_SECONDS
+from modules.common.stores import DEFAULT_STORE
+from db.snapshot import CatalogSnapshot, write_snapshot
 
 logger = set_logger()
 
+# SQLite tuning (cache size in KiB, mmap size in bytes)
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+# Rows read or written per page when exporting / importing catalog snapshots
+SNAPSHOT_PAGE_SIZE = 50000
+
+
+def compact_hash(hash_code) -> bytes:
+    """
+    Compact form of a hash_code for the in-memory hash index.
+    Legacy hex TEXT hashes are truncated to 16 bytes, BLOB digests are used as-is.
+    """
+    if isinstance(hash_code, str):
+        return bytes.fromhex(hash_code[:32])
+    return hash_code or b""
+
 
 class DatabaseManager:
     """SQLite DB for articles."""
@@ -11,104 +34,550 @@ class DatabaseManager:
     def __init__(self, db_path: str):
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self.db_path = db_path
+        # One connection per thread (sqlite3 connections are not shared); connections
+        # of finished threads are closed when the next thread opens one
+        self._local = threading.local()
+        # (owning thread, connection)
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self._initialize_database()
 
     def _get_connection(self):
-        return sqlite3.connect(self.db_path)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                check_same_thread=False,
+                isolation_level=None,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+            conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+            with self._connections_lock:
+                dead = [entry for entry in self._connections if not entry[0].is_alive()]
+                for entry in dead:
+                    self._close_connection(entry[1])
+                    self._connections.remove(entry)
+                self._connections.append((threading.current_thread(), conn))
+        return conn
 
-    def _initialize_database(self):
+    @staticmethod
+    def _close_connection(conn):
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Error closing DB connection: {e}")
+
+    def release_connection(self):
+        """Close this thread's connection now (for threads that are about to end)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._connections_lock:
+            self._connections = [entry for entry in self._connections if entry[1] is not conn]
+        self._close_connection(conn)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a block in one transaction on this thread's connection.
+        Commits on success, rolls back on any exception.
+        Nested use joins the outer transaction.
+        """
         conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS articles (
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+    def close(self):
+        """Close all pooled connections (call on shutdown)."""
+        with self._connections_lock:
+            for _, conn in self._connections:
+                self._close_connection(conn)
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _create_articles_table(self, conn, name: str = "articles"):
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {name} (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                article_id TEXT UNIQUE,
+                store TEXT NOT NULL,
+                article_id TEXT NOT NULL,
                 Bezeichnung TEXT,
                 VKNetto1 TEXT,
                 VKBrutto1 TEXT,
                 ean TEXT,
-                hash_code TEXT,
+                hash_code BLOB,
                 aims_flag INTEGER DEFAULT 1,
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                change_seq INTEGER NOT NULL DEFAULT 0,
+                UNIQUE(store, article_id)
             );
         """
         )
-        conn.commit()
-        conn.close()
 
-    def get_article(self, article_id: str):
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
+    def _migrate_to_multi_store(self, conn):
+        """
+        Rebuild a single-store articles table (article_id UNIQUE) with a store
+        column. Existing rows are assigned to DEFAULT_STORE and keep their id,
+        hash and pending flag.
+        """
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(articles)")]
+        if not columns or "store" in columns:
+            return
+        self._create_articles_table(conn, "articles_multi_store")
+        conn.execute(
             """
-            SELECT article_id, ean, hash_code 
-            FROM articles 
-            WHERE article_id=?
+            INSERT INTO articles_multi_store
+                (id, store, article_id, Bezeichnung, VKNetto1, VKBrutto1, ean,
+                 hash_code, aims_flag, last_updated)
+            SELECT id, ?, article_id, Bezeichnung, VKNetto1, VKBrutto1, ean,
+                   hash_code, aims_flag, last_updated
+            FROM articles
         """,
-            (article_id,),
+            (DEFAULT_STORE,),
         )
-        row = cursor.fetchone()
-        conn.close()
-        return row
+        conn.execute("DROP TABLE articles")
+        conn.execute("ALTER TABLE articles_multi_store RENAME TO articles")
+        logger.info(f"Migrated articles table to multi-store (existing rows -> {DEFAULT_STORE}).")
 
-    def upsert_article(
-        self, article_id: str, name: str, vknetto: str, vkbrutto: str, ean: str, hash_code: str
-    ) -> int:
-        existing = self.get_article(article_id)
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    def _add_change_seq(self, conn):
+        """
+        Add the per-row version counter. It is bumped whenever the label data
+        of a row changes; a sync only clears aims_flag for the version it sent.
+        """
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(articles)")]
+        if "change_seq" not in columns:
+            conn.execute("ALTER TABLE articles ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0")
+            logger.info("Added change_seq version column to articles table.")
 
-        if not existing:
-            cursor.execute(
+    def _initialize_database(self):
+        with self.transaction() as conn:
+            self._migrate_to_multi_store(conn)
+            self._create_articles_table(conn)
+            self._add_change_seq(conn)
+            # Partial index: rows whose hash was cleared by ensure_fingerprint (usually none)
+            conn.execute(
                 """
-                INSERT INTO articles (article_id, Bezeichnung, VKNetto1, VKBrutto1, ean, hash_code, aims_flag)
-                VALUES (?, ?, ?, ?, ?, ?, 1)
-            """,
-                (article_id, name, vknetto, vkbrutto, ean, hash_code),
+                CREATE INDEX IF NOT EXISTS idx_articles_unhashed
+                ON articles(store, article_id) WHERE hash_code IS NULL;
+            """
             )
-            updated = 1
+            # Partial index: finding pending articles (per store) is O(pending), not O(catalog)
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_articles_pending
+                ON articles(store, id) WHERE aims_flag=1;
+            """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """
+            )
+
+    def get_meta(self, key: str, default: str = None):
+        row = self._get_connection().execute(
+            "SELECT value FROM meta WHERE key=?", (key,)
+        ).fetchone()
+        return row[0] if row else default
 
-        elif existing[2] != hash_code:
-            cursor.execute(
+    def set_meta(self, key: str, value: str):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def ensure_fingerprint(self, signature: str, legacy_signature: str = "sha256"):
+        """
+        One-time migration when the row fingerprint changes.
+        Stored hashes made with another fingerprint cannot be compared, so they
+        are cleared; the next upsert of each article stores the new hash and only
+        flags it for AIMS if its label data actually changed.
+        """
+        with self.transaction() as conn:
+            current = self.get_meta("fingerprint", legacy_signature)
+            if current != signature:
+                cleared = conn.execute(
+                    "UPDATE articles SET hash_code=NULL WHERE hash_code IS NOT NULL"
+                ).rowcount
+                logger.info(
+                    f"Fingerprint changed ({current} -> {signature}): "
+                    f"cleared {cleared} stored hashes for re-fingerprinting."
+                )
+            self.set_meta("fingerprint", signature)
+
+    def get_article(self, article_id: str, store: str = DEFAULT_STORE):
+        cursor = self._get_connection().execute(
+            """
+            SELECT article_id, ean, hash_code
+            FROM articles
+            WHERE store=? AND article_id=?
+        """,
+            (store, article_id),
+        )
+        return cursor.fetchone()
+
+    def upsert_article(
+        self,
+        article_id: str,
+        name: str,
+        vknetto: str,
+        vkbrutto: str,
+        ean: str,
+        hash_code: str,
+        store: str = DEFAULT_STORE,
+    ) -> int:
+        with self.transaction() as conn:
+            existing = self.get_article(article_id, store)
+
+            if not existing:
+                conn.execute(
+                    """
+                    INSERT INTO articles (store, article_id, Bezeichnung, VKNetto1, VKBrutto1, ean, hash_code, aims_flag, change_seq)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 1, 1)
+                """,
+                    (store, article_id, name, vknetto, vkbrutto, ean, hash_code),
+                )
+                updated = 1
+
+            elif existing[2] != hash_code:
+                conn.execute(
+                    """
+                    UPDATE articles
+                    SET Bezeichnung=?, VKNetto1=?, VKBrutto1=?, ean=?, hash_code=?, aims_flag=1,
+                        change_seq=change_seq + 1, last_updated=CURRENT_TIMESTAMP
+                    WHERE store=? AND article_id=?
+                """,
+                    (name, vknetto, vkbrutto, ean, hash_code, store, article_id),
+                )
+                updated = 1
+
+            else:
+                updated = 0
+
+        return updated
+
+    def upsert_articles(self, rows) -> dict:
+        """
+        Bulk upsert in a single transaction.
+        rows: iterable of tuples (article_id, Bezeichnung, VKNetto1, VKBrutto1, ean, hash_code, store)
+        Returns counts: {"inserted": int, "updated": int, "unchanged": int}
+        Rows whose hash was cleared by ensure_fingerprint() only get their hash
+        refreshed unless the label data differs; they count as unchanged.
+        Every other change flags the row for AIMS and bumps its change_seq.
+        """
+        rows = list(rows)
+        if not rows:
+            return {"inserted": 0, "updated": 0, "unchanged": 0}
+
+        start = perf_counter()
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            # Hash-only refresh first (cheap check through the unhashed index),
+            # so the upsert below only sees real label changes
+            if cursor.execute(
+                "SELECT EXISTS(SELECT 1 FROM articles WHERE hash_code IS NULL)"
+            ).fetchone()[0]:
+                cursor.executemany(
+                    """
+                    UPDATE articles SET hash_code=?6
+                    WHERE store=?7 AND article_id=?1 AND hash_code IS NULL
+                        AND Bezeichnung IS ?2 AND VKNetto1 IS ?3 AND VKBrutto1 IS ?4 AND ean IS ?5
+                """,
+                    rows,
+                )
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM articles")
+            max_id_before = cursor.fetchone()[0]
+            changes_before = conn.total_changes
+
+            cursor.executemany(
                 """
-                UPDATE articles
-                SET Bezeichnung=?, VKNetto1=?, VKBrutto1=?, ean=?, hash_code=?, aims_flag=1, last_updated=CURRENT_TIMESTAMP
-                WHERE article_id=?
+                INSERT INTO articles (article_id, Bezeichnung, VKNetto1, VKBrutto1, ean, hash_code, store, aims_flag, change_seq)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 1, 1)
+                ON CONFLICT(store, article_id) DO UPDATE SET
+                    Bezeichnung=excluded.Bezeichnung,
+                    VKNetto1=excluded.VKNetto1,
+                    VKBrutto1=excluded.VKBrutto1,
+                    ean=excluded.ean,
+                    hash_code=excluded.hash_code,
+                    aims_flag=1,
+                    change_seq=articles.change_seq + 1,
+                    last_updated=CURRENT_TIMESTAMP
+                WHERE articles.hash_code IS NOT excluded.hash_code
             """,
-                (name, vknetto, vkbrutto, ean, hash_code, article_id),
+                rows,
             )
-            updated = 1
 
-        else:
-            updated = 0
+            changed = conn.total_changes - changes_before
+            # New rows get ids above the previous maximum (AUTOINCREMENT)
+            cursor.execute("SELECT COUNT(*) FROM articles WHERE id > ?", (max_id_before,))
+            inserted = cursor.fetchone()[0]
+        DB_UPSERT_SECONDS.observe(perf_counter() - start)
 
-        conn.commit()
-        conn.close()
-        return updated
+        return {
+            "inserted": inserted,
+            "updated": changed - inserted,
+            "unchanged": len(rows) - changed,
+        }
 
-    def get_pending_for_aims(self):
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
+    def load_hash_index(self, store: str = None) -> dict:
+        """
+        Return {store: {article_id: compact 16-byte hash}} for all articles in
+        one scan, or for the articles of one store.
+        """
+        if store is None:
+            cursor = self._get_connection().execute(
+                "SELECT store, article_id, hash_code FROM articles"
+            )
+        else:
+            cursor = self._get_connection().execute(
+                "SELECT store, article_id, hash_code FROM articles WHERE store=?", (store,)
+            )
+        index = {}
+        for store, article_id, hash_code in cursor:
+            store_index = index.get(store)
+            if store_index is None:
+                store_index = index[store] = {}
+            store_index[article_id] = compact_hash(hash_code)
+        return index
+
+    def get_pending_for_aims(self, store: str = DEFAULT_STORE):
+        cursor = self._get_connection().execute(
             """
             SELECT article_id, Bezeichnung, VKNetto1, VKBrutto1, ean
             FROM articles
-            WHERE aims_flag=1
-        """
+            WHERE aims_flag=1 AND store=?
+        """,
+            (store,),
         )
-        rows = cursor.fetchall()
-        conn.close()
-        return rows
+        return cursor.fetchall()
 
-    def mark_aims_sent(self, article_ids: list):
+    def pending_stores(self) -> list:
+        """Stores with at least one article waiting for AIMS."""
+        cursor = self._get_connection().execute(
+            "SELECT DISTINCT store FROM articles WHERE aims_flag=1 ORDER BY store"
+        )
+        return [row[0] for row in cursor]
+
+    def iter_pending_for_aims(self, page_size: int = 5000, store: str = DEFAULT_STORE):
+        """
+        Yield a store's pending articles in pages (lists of tuples
+        (article_id, Bezeichnung, VKNetto1, VKBrutto1, ean, change_seq)) using
+        keyset pagination on id, so marking rows as sent while iterating is safe.
+        """
+        conn = self._get_connection()
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                """
+                SELECT id, article_id, Bezeichnung, VKNetto1, VKBrutto1, ean, change_seq
+                FROM articles
+                WHERE aims_flag=1 AND store=? AND id > ?
+                ORDER BY id
+                LIMIT ?
+            """,
+                (store, last_id, page_size),
+            ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [row[1:] for row in rows]
+
+    def count_pending_for_aims(self, store: str = None) -> int:
+        """Pending articles of one store, or of all stores if store is None."""
+        if store is None:
+            return self._get_connection().execute(
+                "SELECT COUNT(*) FROM articles WHERE aims_flag=1"
+            ).fetchone()[0]
+        return self._get_connection().execute(
+            "SELECT COUNT(*) FROM articles WHERE aims_flag=1 AND store=?", (store,)
+        ).fetchone()[0]
+
+    def mark_aims_sent(self, article_ids: list, store: str = DEFAULT_STORE):
+        """
+        Unconditionally mark articles as sent, whatever version they hold now.
+        Syncs use mark_aims_sent_versions, which cannot clear a newer change.
+        """
         if not article_ids:
             return
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE articles SET aims_flag=0 WHERE store=? AND article_id=?",
+                [(store, aid) for aid in article_ids],
+            )
+
+    def mark_aims_sent_versions(self, rows: list) -> int:
+        """
+        Mark articles as sent only if they are still at the version that was sent.
+        rows: tuples (article_id, change_seq, store)
+        A row changed by a concurrent CSV import (even back to the sent data)
+        has a newer change_seq and keeps aims_flag=1.
+        Returns the number of articles marked.
+        """
+        if not rows:
+            return 0
+        with self.transaction() as conn:
+            changes_before = conn.total_changes
+            conn.executemany(
+                "UPDATE articles SET aims_flag=0 WHERE article_id=? AND change_seq=? AND store=? AND aims_flag=1",
+                rows,
+            )
+            return conn.total_changes - changes_before
+
+    def stores(self) -> list:
+        """All stores with articles."""
+        cursor = self._get_connection().execute("SELECT DISTINCT store FROM articles ORDER BY store")
+        return [row[0] for row in cursor]
+
+    def iter_synced_for_aims(self, page_size: int = 5000, store: str = DEFAULT_STORE):
+        """
+        Yield a store's articles marked as synced (aims_flag=0) in pages of
+        tuples (article_id, Bezeichnung, VKNetto1, VKBrutto1, ean), keyset
+        paginated on article_id through the (store, article_id) index, so
+        only the store's own rows are read.
+        """
         conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.executemany(
-            "UPDATE articles SET aims_flag=0 WHERE article_id=?",
-            [(aid,) for aid in article_ids],
+        last_article_id = ""
+        while True:
+            rows = conn.execute(
+                """
+                SELECT article_id, Bezeichnung, VKNetto1, VKBrutto1, ean
+                FROM articles
+                WHERE store=? AND article_id > ? AND aims_flag=0
+                ORDER BY article_id
+                LIMIT ?
+            """,
+                (store, last_article_id, page_size),
+            ).fetchall()
+            if not rows:
+                return
+            last_article_id = rows[-1][0]
+            yield rows
+
+    def snapshot_version(self, store: str) -> tuple:
+        """
+        (articles, sum of change_seq) of a store. Every insert and every label
+        change alters it, so a snapshot recorded at the current version holds
+        the store's current data.
+        """
+        row = self._get_connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(change_seq), 0) FROM articles WHERE store=?", (store,)
+        ).fetchone()
+        return tuple(row)
+
+    def snapshot_is_current(self, snapshot: CatalogSnapshot) -> bool:
+        """True if a snapshot matches its store in the DB (same version and fingerprint)."""
+        return (
+            snapshot.fingerprint == self.get_meta("fingerprint")
+            and snapshot.version == self.snapshot_version(snapshot.store)
         )
-        conn.commit()
-        conn.close()
+
+    def catalog_generation(self) -> int:
+        """Counter bumped whenever articles are rewritten outside of upserts (snapshot imports)."""
+        return int(self.get_meta("catalog_generation", "0"))
+
+    def export_snapshot(self, path: str, store: str = DEFAULT_STORE) -> int:
+        """
+        Write a store's articles to a columnar snapshot file (see db.snapshot),
+        read in one transaction so rows and version match. Legacy TEXT hashes
+        are exported as NULL. Returns the number of articles written.
+        """
+        conn = self._get_connection()
+        nested = conn.in_transaction
+        if not nested:
+            # Deferred: a WAL read transaction does not block writers
+            conn.execute("BEGIN")
+        try:
+            version = self.snapshot_version(store)
+            cursor = conn.execute(
+                """
+                SELECT article_id, Bezeichnung, VKNetto1, VKBrutto1, ean,
+                       CASE WHEN typeof(hash_code)='blob' THEN hash_code END,
+                       aims_flag, change_seq
+                FROM articles
+                WHERE store=?
+                ORDER BY article_id
+            """,
+                (store,),
+            )
+            pages = iter(lambda: cursor.fetchmany(SNAPSHOT_PAGE_SIZE), [])
+            count = write_snapshot(path, pages, store, self.get_meta("fingerprint"), version)
+        finally:
+            if not nested:
+                conn.rollback()
+        logger.info(f"Exported {count} articles of store {store} to snapshot {path}.")
+        return count
+
+    def import_snapshot(self, path: str, pending: bool = False) -> int:
+        """
+        Replace a store's articles with the ones of a snapshot, e.g. to restore
+        a catalog. pending=True flags all of them for upload (full resync of the
+        store in AIMS). change_seq continues above the store's previous
+        versions (also for legacy rows at 0), so in-flight syncs cannot mark
+        imported rows as sent. Hashes
+        of another fingerprint are dropped like in ensure_fingerprint.
+        Returns the number of articles imported.
+        """
+        with CatalogSnapshot(path) as snapshot, self.transaction() as conn:
+            store = snapshot.store
+            keep_hashes = snapshot.fingerprint == self.get_meta("fingerprint")
+            seq_base = conn.execute(
+                "SELECT COALESCE(MAX(change_seq), 0) FROM articles WHERE store=?", (store,)
+            ).fetchone()[0]
+            conn.execute("DELETE FROM articles WHERE store=?", (store,))
+            # Tells running loaders to reload their hash index
+            self.set_meta("catalog_generation", str(self.catalog_generation() + 1))
+            for rows in snapshot.iter_rows(SNAPSHOT_PAGE_SIZE):
+                conn.executemany(
+                    """
+                    INSERT INTO articles (article_id, Bezeichnung, VKNetto1, VKBrutto1, ean,
+                                          hash_code, aims_flag, change_seq, store)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                    [
+                        (
+                            article_id, name, vknetto, vkbrutto, ean,
+                            hash_code if keep_hashes else None,
+                            1 if pending else aims_flag,
+                            seq_base + 1 + change_seq,
+                            store,
+                        )
+                        for article_id, name, vknetto, vkbrutto, ean, hash_code, aims_flag, change_seq in rows
+                    ],
+                )
+        logger.info(
+            f"Imported {len(snapshot)} articles of store {store} from snapshot {path}"
+            f"{' (all pending for AIMS)' if pending else ''}."
+        )
+        return len(snapshot)
+
+    def flag_for_aims(self, article_ids: list, store: str = DEFAULT_STORE) -> int:
+        """Mark synced articles as pending again. Returns the number of articles flagged."""
+        if not article_ids:
+            return 0
+        with self.transaction() as conn:
+            changes_before = conn.total_changes
+            conn.executemany(
+                "UPDATE articles SET aims_flag=1 WHERE store=? AND article_id=? AND aims_flag=0",
+                [(store, aid) for aid in article_ids],
+            )
+            return conn.total_changes - changes_before
@@ -0,0 +1,255 @@
+import os
+import sys
+import mmap
+import json
+import time
+import struct
+from array import array
+from itertools import accumulate, islice
+
+SNAPSHOT_MAGIC = b"AIMSSNAP"
+SNAPSHOT_FORMAT = 1
+# magic, format version, header length
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGN = 8
+
+# Snapshot columns in row order: name -> type
+# str: UTF-8 values, bytes: raw values (both length-prefixed via offsets), q: int64, B: uint8
+SNAPSHOT_COLUMNS = {
+    "article_id": "str",
+    "Bezeichnung": "str",
+    "VKNetto1": "str",
+    "VKBrutto1": "str",
+    "ean": "str",
+    "hash_code": "bytes",
+    "aims_flag": "B",
+    "change_seq": "q",
+}
+
+
+def snapshot_path(directory: str, store: str) -> str:
+    """File of a store's snapshot in a snapshot directory."""
+    return os.path.join(directory, f"{store}.snapshot")
+
+
+def _little_endian(values: array) -> array:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+class _ColumnBuilder:
+    """Collects one column: offsets + data for str/bytes, a plain array for numbers."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        if kind in ("str", "bytes"):
+            self.offsets = array("Q", [0])
+            self.data = bytearray()
+            self.valid = bytearray()
+            self.nulls = 0
+        else:
+            self.values = array(kind)
+
+    def extend(self, values: tuple):
+        """Append one page of values (a column of rows)."""
+        if self.kind not in ("str", "bytes"):
+            self.values.extend(values if None not in values else (value or 0 for value in values))
+            return
+        nulls = values.count(None)
+        if nulls:
+            self.nulls += nulls
+            self.valid.extend(value is not None for value in values)
+            empty = "" if self.kind == "str" else b""
+            values = [empty if value is None else value for value in values]
+        else:
+            self.valid += b"\x01" * len(values)
+        if self.kind == "str":
+            text = "".join(values)
+            data = text.encode("utf-8")
+            if len(data) != len(text):
+                # Non-ASCII text: character lengths are not byte lengths
+                values = [value.encode("utf-8") for value in values]
+        else:
+            data = b"".join(values)
+        self.offsets.extend(islice(accumulate(map(len, values), initial=self.offsets[-1]), 1, None))
+        self.data += data
+
+    def buffers(self) -> dict:
+        if self.kind not in ("str", "bytes"):
+            return {"values": _little_endian(self.values)}
+        # 32-bit offsets unless the column holds more than 4 GiB
+        offsets = self.offsets if len(self.data) > 0xFFFFFFFF else array("I", self.offsets)
+        buffers = {"offsets": _little_endian(offsets), "data": self.data}
+        # Validity is only stored for columns with NULLs
+        if self.nulls:
+            buffers["valid"] = self.valid
+        return buffers
+
+
+def write_snapshot(path: str, pages, store: str, fingerprint: str = None, version=None) -> int:
+    """
+    Write one store's rows, given as pages (lists of tuples in SNAPSHOT_COLUMNS
+    order), as a columnar snapshot file: a JSON header followed by one 8-byte
+    aligned buffer per column (offsets + data for strings, fixed-width arrays
+    for numbers). version is the DB state the rows were read at (see
+    DatabaseManager.snapshot_version). The file is replaced atomically.
+    Returns the number of rows written.
+    """
+    builders = [_ColumnBuilder(kind) for kind in SNAPSHOT_COLUMNS.values()]
+    count = 0
+    for page in pages:
+        if not page:
+            continue
+        for builder, values in zip(builders, zip(*page)):
+            builder.extend(values)
+        count += len(page)
+
+    # Lay out the buffers behind the header, then write header and buffers
+    columns = []
+    payload = []
+    position = 0
+    for (name, kind), builder in zip(SNAPSHOT_COLUMNS.items(), builders):
+        column = {"name": name, "type": kind}
+        for role, buffer in builder.buffers().items():
+            size = len(buffer) * (buffer.itemsize if isinstance(buffer, array) else 1)
+            column[role] = [position, size]
+            if role == "offsets":
+                column["offset_type"] = buffer.typecode
+            payload.append(buffer)
+            position += size + (-size % _ALIGN)
+        columns.append(column)
+    header = json.dumps(
+        {
+            "store": store,
+            "rows": count,
+            "fingerprint": fingerprint,
+            "version": list(version) if version is not None else None,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "columns": columns,
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+    header += b" " * (-(_PREAMBLE.size + len(header)) % _ALIGN)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, len(header)))
+        f.write(header)
+        for buffer in payload:
+            size = len(buffer) * (buffer.itemsize if isinstance(buffer, array) else 1)
+            f.write(buffer)
+            f.write(b"\0" * (-size % _ALIGN))
+    os.replace(tmp_path, path)
+    return count
+
+
+class CatalogSnapshot:
+    """
+    Read-only, memory-mapped view of a snapshot written by write_snapshot.
+    Only the header is read up front; column ranges are decoded on demand
+    from the mapping, so only the pages touched are read from disk.
+    Use as a context manager or close().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < _PREAMBLE.size:
+                raise ValueError(f"{path} is not a catalog snapshot")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        try:
+            magic, version, header_len = _PREAMBLE.unpack_from(self._mmap)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a catalog snapshot")
+            if version != SNAPSHOT_FORMAT:
+                raise ValueError(f"{path} has snapshot format {version}, expected {SNAPSHOT_FORMAT}")
+            self.header = json.loads(self._mmap[_PREAMBLE.size:_PREAMBLE.size + header_len])
+        except BaseException:
+            self.close()
+            raise
+        self._data_start = _PREAMBLE.size + header_len
+        self._columns = {column["name"]: column for column in self.header["columns"]}
+
+    @property
+    def store(self) -> str:
+        return self.header["store"]
+
+    @property
+    def fingerprint(self) -> str:
+        return self.header["fingerprint"]
+
+    @property
+    def version(self):
+        version = self.header.get("version")
+        return tuple(version) if version is not None else None
+
+    def __len__(self):
+        return self.header["rows"]
+
+    def _read(self, column: dict, role: str, start: int, stop: int, typecode: str = None):
+        """Copy items start:stop of a column buffer out of the mapping (array, or bytes if no typecode)."""
+        offset = self._data_start + column[role][0]
+        itemsize = array(typecode).itemsize if typecode else 1
+        chunk = self._mmap[offset + start * itemsize:offset + stop * itemsize]
+        if typecode is None:
+            return chunk
+        values = array(typecode, chunk)
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values
+
+    def column(self, name: str, start: int = 0, stop: int = None) -> list:
+        """Values start:stop of a column as a list (None for NULLs)."""
+        column = self._columns[name]
+        kind = column["type"]
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= stop:
+            return []
+        if kind not in ("str", "bytes"):
+            return self._read(column, "values", start, stop, kind).tolist()
+        offsets = self._read(column, "offsets", start, stop + 1, column["offset_type"])
+        base = offsets[0]
+        data = self._read(column, "data", base, offsets[-1])
+        ends = offsets if not base else [offset - base for offset in offsets]
+        bounds = zip(ends, ends[1:])
+        if kind == "bytes":
+            values = [data[begin:end] for begin, end in bounds]
+        else:
+            text = data.decode("utf-8")
+            if len(text) == len(data):
+                # ASCII only: byte offsets are character offsets, slice the decoded text
+                values = [text[begin:end] for begin, end in bounds]
+            else:
+                values = [data[begin:end].decode("utf-8") for begin, end in bounds]
+        if "valid" in column:
+            valid = self._read(column, "valid", start, stop)
+            values = [value if flag else None for value, flag in zip(values, valid)]
+        return values
+
+    def hash_index(self) -> dict:
+        """{article_id: compact hash} of the snapshot, like one store of load_hash_index."""
+        return dict(zip(self.column("article_id"), self.column("hash_code")))
+
+    def iter_rows(self, page_size: int = 5000):
+        """Yield the rows (in SNAPSHOT_COLUMNS order) in pages of lists of tuples."""
+        for start in range(0, len(self), page_size):
+            stop = start + page_size
+            yield list(zip(*(self.column(name, start, stop) for name in SNAPSHOT_COLUMNS)))
+
+    def close(self):
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
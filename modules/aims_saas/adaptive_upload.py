@@ -0,0 +1,148 @@
+import os
+import random
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from time import monotonic, sleep, time
+
+# Initial / min / max serialized bytes per article upload chunk
+AIMS_CHUNK_TARGET_BYTES = int(os.getenv("AIMS_CHUNK_TARGET_BYTES", str(1024 * 1024)))
+AIMS_CHUNK_MIN_BYTES = int(os.getenv("AIMS_CHUNK_MIN_BYTES", str(16 * 1024)))
+AIMS_CHUNK_MAX_BYTES = int(os.getenv("AIMS_CHUNK_MAX_BYTES", str(8 * 1024 * 1024)))
+# Chunks answered faster than half of this grow, slower ones shrink (seconds)
+AIMS_CHUNK_TARGET_LATENCY = float(os.getenv("AIMS_CHUNK_TARGET_LATENCY", "5"))
+# Exponential backoff base and cap (seconds)
+AIMS_BACKOFF_BASE = float(os.getenv("AIMS_BACKOFF_BASE", "1"))
+AIMS_BACKOFF_MAX = float(os.getenv("AIMS_BACKOFF_MAX", "60"))
+
+# Statuses after which a chunk is worth retrying (None = timeout / transport error)
+RETRYABLE_STATUS = {None, 401, 408, 413, 429, 500, 502, 503, 504}
+# Statuses that mean "this chunk was too big or too slow"
+SHRINK_STATUS = {None, 408, 413, 504}
+
+
+class AdaptiveChunkSizer:
+    """
+    Chooses upload chunk sizes by serialized byte size.
+    Grows the byte target after fast successes, shrinks it after slow
+    responses, and halves it after timeouts / 413. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        target_bytes=AIMS_CHUNK_TARGET_BYTES,
+        min_bytes=AIMS_CHUNK_MIN_BYTES,
+        max_bytes=AIMS_CHUNK_MAX_BYTES,
+        target_latency=AIMS_CHUNK_TARGET_LATENCY,
+    ):
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self.target_bytes = min(max(target_bytes, min_bytes), max_bytes)
+        # Smallest body rejected with 413; never grow back above it
+        self.ceiling_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=100)
+        self.grows = 0
+        self.shrinks = 0
+
+    def take(self, encoded_articles: list, start: int, max_articles: int) -> int:
+        """Return the end index of the next chunk starting at `start`."""
+        with self._lock:
+            budget = self.target_bytes
+        end = start
+        size = 2  # "[" + "]"
+        limit = min(len(encoded_articles), start + max_articles)
+        while end < limit:
+            size += len(encoded_articles[end]) + 1
+            if size > budget and end > start:
+                break
+            end += 1
+        return end
+
+    def record(self, articles: int, nbytes: int, elapsed: float, status_code):
+        """Feed back the outcome of one chunk upload."""
+        with self._lock:
+            self._history.append((articles, nbytes, round(elapsed, 3), status_code))
+            if status_code == 413:
+                self.ceiling_bytes = max(min(self.ceiling_bytes, nbytes - 1), self.min_bytes)
+            if status_code in SHRINK_STATUS:
+                self._resize(min(self.target_bytes, nbytes) * 0.5)
+            elif status_code in (200, 202):
+                if elapsed > self.target_latency:
+                    self._resize(self.target_bytes * 0.7)
+                elif elapsed < self.target_latency / 2 and nbytes >= self.target_bytes * 0.8:
+                    self._resize(self.target_bytes * 1.5)
+
+    def _resize(self, new_target):
+        new_target = int(min(max(new_target, self.min_bytes), self.ceiling_bytes))
+        if new_target > self.target_bytes:
+            self.grows += 1
+        elif new_target < self.target_bytes:
+            self.shrinks += 1
+        self.target_bytes = new_target
+
+    def metrics(self) -> dict:
+        with self._lock:
+            recent = list(self._history)
+        return {
+            "target_bytes": self.target_bytes,
+            "ceiling_bytes": self.ceiling_bytes,
+            "grows": self.grows,
+            "shrinks": self.shrinks,
+            "recent_chunks": [
+                {"articles": a, "bytes": b, "elapsed": e, "status": s}
+                for a, b, e, s in recent[-10:]
+            ],
+        }
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` acquisitions per second with bursts of up to
+    `burst`. acquire() blocks until a slot is free. Thread-safe.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a slot; returns the seconds to wait before using it (for async callers)."""
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve a token now; a negative balance is the caller's wait
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            sleep(delay)
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after=None, base=AIMS_BACKOFF_BASE, cap=AIMS_BACKOFF_MAX):
+    """Exponential backoff with full jitter; never shorter than Retry-After."""
+    delay = random.uniform(0, min(cap, base * (2 ** max(attempt - 1, 0))))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
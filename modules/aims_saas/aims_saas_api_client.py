@@ -1,106 +1,341 @@
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
+import gzip
 import json
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
+from env import TIMEOUT, VERIFY_SSL
+from modules.aims_saas.adaptive_upload import AdaptiveChunkSizer, parse_retry_after
+from modules.aims_saas.payload import EncodedArticles, encode
+from modules.aims_saas.token_manager import TokenManager
 from modules.common.common import set_logger
-from time import time
+from modules.common.metrics import (
+    AIMS_REQUEST_SECONDS,
+    AIMS_TOKEN_REFRESHES,
+    AIMS_UPLOADED_ARTICLES,
+    AIMS_UPLOADED_BYTES,
+)
+from time import perf_counter
 
 load_dotenv()
 logger = set_logger()
 
+# Max article chunks uploaded concurrently by add_articles
+AIMS_SAAS_MAX_IN_FLIGHT = int(os.getenv("AIMS_SAAS_MAX_IN_FLIGHT", "4"))
+# Min keep-alive connections kept per host by the shared session; raised to the
+# number of concurrent uploads (callers x AIMS_SAAS_MAX_IN_FLIGHT) when that is higher
+AIMS_SAAS_POOL_SIZE = int(os.getenv("AIMS_SAAS_POOL_SIZE", "10"))
+# Timeout (seconds) for article uploads; other calls use env.TIMEOUT
+AIMS_SAAS_UPLOAD_TIMEOUT = float(os.getenv("AIMS_SAAS_UPLOAD_TIMEOUT", "20"))
+# Gzip upload bodies of at least this many bytes (0 = disabled)
+AIMS_SAAS_GZIP_MIN_BYTES = int(os.getenv("AIMS_SAAS_GZIP_MIN_BYTES", "0"))
+# Articles per page when listing a store's articles
+AIMS_SAAS_LIST_PAGE_SIZE = int(os.getenv("AIMS_SAAS_LIST_PAGE_SIZE", "1000"))
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default timeout when a request has none."""
+
+    def __init__(self, *args, timeout=TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def create_session(
+    pool_size=AIMS_SAAS_POOL_SIZE, timeout=TIMEOUT, concurrent_requests=AIMS_SAAS_MAX_IN_FLIGHT
+):
+    """
+    Shared keep-alive session with a sized connection pool and default timeout.
+    The pool holds at least concurrent_requests connections, otherwise urllib3
+    discards the surplus connections after each burst ("Connection pool is full").
+    """
+    session = requests.Session()
+    adapter = TimeoutHTTPAdapter(
+        timeout=timeout,
+        pool_connections=pool_size,
+        pool_maxsize=max(pool_size, concurrent_requests),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.verify = VERIFY_SSL
+    session.headers.update({"accept": "application/json"})
+    return session
+
+
+@dataclass
+class ChunkResult:
+    """Outcome of uploading one chunk of articles."""
+
+    index: int
+    articles: list
+    # Position of the chunk's first article in the uploaded articles
+    offset: int = 0
+    status_code: int = None
+    text: str = ""
+    error: str = None
+    elapsed: float = 0.0
+    nbytes: int = 0
+    retry_after: float = None
+
+    @property
+    def ok(self):
+        return self.status_code in (200, 202)
+
+
+@dataclass
+class UploadResult:
+    """Aggregated outcome of add_articles over all chunks."""
+
+    chunks: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return all(chunk.ok for chunk in self.chunks)
+
+    @property
+    def succeeded(self):
+        return [chunk for chunk in self.chunks if chunk.ok]
+
+    @property
+    def failed(self):
+        return [chunk for chunk in self.chunks if not chunk.ok]
+
+    @property
+    def status_code(self):
+        """First failing status code (None for transport errors), else the last one."""
+        for chunk in self.chunks:
+            if not chunk.ok:
+                return chunk.status_code
+        return self.chunks[-1].status_code if self.chunks else 200
+
+    @property
+    def retry_after(self):
+        """Longest Retry-After requested by any failed chunk, if any."""
+        delays = [c.retry_after for c in self.failed if c.retry_after is not None]
+        return max(delays) if delays else None
+
+    @property
+    def text(self):
+        return "; ".join(
+            f"chunk {chunk.index}: {chunk.status_code} {chunk.error or chunk.text}"
+            for chunk in self.failed
+        )
+
+
+def record_chunk_result(chunk_sizer, chunk_result):
+    """Feed a finished chunk upload into the chunk sizer and the metrics."""
+    chunk_sizer.record(
+        len(chunk_result.articles),
+        chunk_result.nbytes,
+        chunk_result.elapsed,
+        chunk_result.status_code,
+    )
+    AIMS_REQUEST_SECONDS.observe(chunk_result.elapsed, status=chunk_result.status_code or "error")
+    AIMS_UPLOADED_BYTES.inc(chunk_result.nbytes)
+    if chunk_result.ok:
+        AIMS_UPLOADED_ARTICLES.inc(len(chunk_result.articles))
+
 
 class AIMSSaaSAPIClient:
     BASE_URL = os.getenv("AIMS_SAAS_URL")
 
-    def __init__(self):
+    def __init__(self, base_url: str = None, concurrent_uploads: int = 1):
+        """concurrent_uploads: add_articles calls that may run at the same time (sizes the pool)."""
+        if base_url:
+            self.BASE_URL = base_url
         self.username = os.getenv("AIMS_SAAS_USERNAME", None)
         self.password = os.getenv("AIMS_SAAS_PASSWORD", None)
-        self.access_token = None
-        self.refresh_token = None
-        self.access_token_expiry = 0  # Unix timestamp for token expiration
+        # Shared, thread-safe access token with background refresh
+        self.tokens = TokenManager(self._request_token)
         self.company = os.getenv("AIMS_SAAS_COMPANY", None)
+        self.session = create_session(concurrent_requests=concurrent_uploads * AIMS_SAAS_MAX_IN_FLIGHT)
+        # Shared across add_articles calls so learned chunk sizes carry over
+        self.chunk_sizer = AdaptiveChunkSizer()
 
-    def get_access_token(self):
-        """
-        Retrieve a valid authentication token using username/password.
-        Automatically refreshes if missing or expired.
-        """
-        if self.access_token and time() < self.access_token_expiry:
-            return self.access_token
+    def close(self):
+        self.tokens.close()
+        self.session.close()
+
+    @property
+    def access_token(self):
+        return self.tokens.access_token
 
-        endpoint = f"{self.BASE_URL}/api/v2/token"
+    @property
+    def refresh_token(self):
+        return self.tokens.refresh_token
+
+    @property
+    def access_token_expiry(self):
+        """Unix timestamp the current access token expires."""
+        return self.tokens.expires_at
+
+    def _request_token(self, refresh_token=None):
+        """Token response message for a refresh token or, if None, for username/password."""
+        if refresh_token:
+            endpoint = f"{self.BASE_URL}/api/v2/token/refresh"
+            data = {"refreshToken": refresh_token}
+        else:
+            endpoint = f"{self.BASE_URL}/api/v2/token"
+            data = {"username": self.username, "password": self.password}
         headers = {"accept": "application/json", "Content-Type": "application/json"}
-        data = {"username": self.username, "password": self.password}
 
-        response = requests.post(endpoint, headers=headers, data=json.dumps(data))
+        response = self.session.post(endpoint, headers=headers, data=json.dumps(data))
         response.raise_for_status()
+        AIMS_TOKEN_REFRESHES.inc(grant="refresh_token" if refresh_token else "password")
+        return response.json()["responseMessage"]
 
-        token_data = response.json()["responseMessage"]
-        self.access_token = token_data["access_token"]
-        self.refresh_token = token_data["refresh_token"]
-        # Set expiry 1 minute earlier than 1 hour
-        self.access_token_expiry = time() + 3600 - 60
+    def get_access_token(self):
+        """
+        Valid access token. Cached and refreshed in the background before it
+        expires; concurrent callers share one token request. Thread-safe.
+        """
+        return self.tokens.get_token()
 
-        logger.info("Successfully obtained new access token.")
-        return self.access_token
+    def _check_auth(self, response, token):
+        """Drop the cached token if AIMS rejected it, so the next call gets a new one."""
+        if response.status_code == 401:
+            self.tokens.invalidate(token)
 
     # ------------------- Existing methods updated to ensure fresh token -------------------
 
     def get_article_upload_format(self):
-        self.get_access_token()
+        token = self.get_access_token()
         endpoint = f"{self.BASE_URL}/api/v2/common/articles/upload/format"
         params = {"company": self.company}
         headers = {
             "accept": "application/json",
-            "Authorization": f"Bearer {self.access_token}",
+            "Authorization": f"Bearer {token}",
         }
 
-        response = requests.put(endpoint, headers=headers, params=params)
+        response = self.session.put(endpoint, headers=headers, params=params)
+        self._check_auth(response, token)
         if response.status_code in (200, 202):
             return response.json()
         else:
             response.raise_for_status()
 
-    def add_articles(self, store_code, articles, chunk_size=5000):
+    def _put_articles_chunk(self, endpoint, headers, params, index, offset, chunk, body):
+        result = ChunkResult(index=index, articles=chunk, offset=offset, nbytes=len(body))
+        start = perf_counter()
+        headers = {**headers, "Content-Type": "application/json"}
+        if AIMS_SAAS_GZIP_MIN_BYTES and len(body) >= AIMS_SAAS_GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        try:
+            # Per chunk, so long uploads pick up refreshed tokens
+            token = self.get_access_token()
+            headers["Authorization"] = f"Bearer {token}"
+            response = self.session.put(
+                endpoint,
+                headers=headers,
+                params=params,
+                data=body,
+                timeout=AIMS_SAAS_UPLOAD_TIMEOUT,
+            )
+            result.status_code = response.status_code
+            self._check_auth(response, token)
+            if not result.ok:
+                result.text = response.text
+                result.retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                logger.error(
+                    f"Error sending articles chunk {index}: {response.status_code} → {response.text}"
+                )
+        except Exception as e:
+            logger.error(f"HTTP request failed for chunk {index}: {e}")
+            result.error = str(e)
+        result.elapsed = perf_counter() - start
+        return result
+
+    def add_articles(
+        self,
+        store_code,
+        articles,
+        chunk_size=5000,
+        max_in_flight=None,
+        on_chunk_done=None,
+        rate_limiter=None,
+    ):
+        """
+        Upload articles in chunks, up to max_in_flight chunks concurrently.
+        articles is a list of article dicts or an EncodedArticles (serialized
+        already; chunk results then carry its keys instead of dicts).
+        Chunks are sized by serialized bytes (self.chunk_sizer), capped at
+        chunk_size articles. Every chunk is attempted; returns an UploadResult
+        with per-chunk results. on_chunk_done(chunk_result) is called in the
+        calling thread as soon as each chunk finishes, so callers can
+        checkpoint per chunk. rate_limiter.acquire() is called before each
+        chunk request is started.
+        """
         self.get_access_token()
         endpoint = f"{self.BASE_URL}/api/v2/common/articles"
-        headers = {
-            "accept": "application/json",
-            "Authorization": f"Bearer {self.access_token}",
-        }
+        headers = {"accept": "application/json"}
         params = {"company": self.company, "store": store_code}
-        last_response = None
+        max_in_flight = max_in_flight or AIMS_SAAS_MAX_IN_FLIGHT
 
-        while articles:
-            chunk, articles = articles[:chunk_size], articles[chunk_size:]
-            try:
-                response = requests.put(
-                    endpoint, headers=headers, params=params, json=chunk, timeout=20
-                )
-            except Exception as e:
-                logger.error(f"HTTP request failed: {e}")
-                return None
+        if isinstance(articles, EncodedArticles):
+            encoded, items = articles.encoded, articles.keys
+        else:
+            # Serialize each article once; chunk bodies are joined from these
+            encoded, items = [encode(article) for article in articles], articles
+        result = UploadResult()
+        position = 0
+        index = 0
+        in_flight = set()
 
-            last_response = response
-            if response.status_code not in (200, 202):
-                logger.error(
-                    f"Error sending articles: {response.status_code} → {response.text}"
-                )
-                return response
+        with ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="aims-upload"
+        ) as pool:
+            while position < len(items) or in_flight:
+                # Chunks are cut lazily so each one uses the latest size target
+                while position < len(items) and len(in_flight) < max_in_flight:
+                    end = self.chunk_sizer.take(encoded, position, chunk_size)
+                    body = b"[" + b",".join(encoded[position:end]) + b"]"
+                    if rate_limiter:
+                        rate_limiter.acquire()
+                    in_flight.add(
+                        pool.submit(
+                            self._put_articles_chunk,
+                            endpoint,
+                            headers,
+                            params,
+                            index,
+                            position,
+                            items[position:end],
+                            body,
+                        )
+                    )
+                    position = end
+                    index += 1
 
-            logger.debug(
-                f"Sent {len(chunk)} articles for store {store_code}, {len(articles)} pending"
-            )
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_result = future.result()
+                    record_chunk_result(self.chunk_sizer, chunk_result)
+                    result.chunks.append(chunk_result)
+                    if on_chunk_done:
+                        on_chunk_done(chunk_result)
 
-        return last_response
+        result.chunks.sort(key=lambda chunk: chunk.index)
+        logger.debug(
+            f"Sent {len(articles)} articles for store {store_code} in {len(result.chunks)} chunks, "
+            f"{len(result.failed)} failed, chunk target {self.chunk_sizer.target_bytes} bytes"
+        )
+        return result
 
     def get_article(self, store_code, article_id):
-        self.get_access_token()
+        token = self.get_access_token()
         endpoint = f"{self.BASE_URL}/api/v1/articles/article"
         headers = {
             "accept": "application/json",
-            "Authorization": f"Bearer {self.access_token}",
+            "Authorization": f"Bearer {token}",
         }
         params = {
             "company": self.company,
@@ -108,23 +343,44 @@ class AIMSSaaSAPIClient:
             "articleId": article_id,
         }
 
-        response = requests.get(endpoint, headers=headers, params=params)
+        response = self.session.get(endpoint, headers=headers, params=params)
+        self._check_auth(response, token)
         if response.status_code not in (200, 202):
             logger.error(response.json().get("responseMessage", ""))
             response.raise_for_status()
         logger.debug(f"Got {article_id} for store {store_code}")
         return response.json()
 
+    def list_articles(self, store_code, page=0, size=AIMS_SAAS_LIST_PAGE_SIZE):
+        """One page of a store's articles (articleList, totalPages, ...), pages count from 0."""
+        token = self.get_access_token()
+        endpoint = f"{self.BASE_URL}/api/v2/common/articles"
+        headers = {
+            "accept": "application/json",
+            "Authorization": f"Bearer {token}",
+        }
+        params = {"company": self.company, "store": store_code, "page": page, "size": size}
+
+        response = self.session.get(endpoint, headers=headers, params=params)
+        self._check_auth(response, token)
+        if response.status_code == 204:
+            return {"articleList": []}
+        if response.status_code not in (200, 202):
+            logger.error(f"Listing articles of store {store_code} failed: {response.status_code} {response.text}")
+            response.raise_for_status()
+        return response.json()
+
     def unlink_label(self, label_code):
-        self.get_access_token()
+        token = self.get_access_token()
         endpoint = f"{self.BASE_URL}/api/v1/labels/unlink"
         params = {"company": self.company, "labelCode": label_code}
         headers = {
             "accept": "application/json",
-            "Authorization": f"Bearer {self.access_token}",
+            "Authorization": f"Bearer {token}",
         }
 
-        response = requests.post(endpoint, headers=headers, params=params)
+        response = self.session.post(endpoint, headers=headers, params=params)
+        self._check_auth(response, token)
         if response.status_code in (200, 202):
             return response.json()
         else:
@@ -0,0 +1,223 @@
+import os
+import gzip
+import asyncio
+from time import perf_counter
+
+try:
+    import aiohttp
+except ImportError:  # optional, only needed for AsyncAIMSSaaSAPIClient
+    aiohttp = None
+
+from env import TIMEOUT, VERIFY_SSL
+from modules.aims_saas.adaptive_upload import AdaptiveChunkSizer, parse_retry_after
+from modules.aims_saas.aims_saas_api_client import (
+    AIMS_SAAS_GZIP_MIN_BYTES,
+    AIMS_SAAS_MAX_IN_FLIGHT,
+    AIMS_SAAS_UPLOAD_TIMEOUT,
+    AIMSSaaSAPIClient,
+    ChunkResult,
+    UploadResult,
+    record_chunk_result,
+)
+from modules.aims_saas.payload import EncodedArticles, encode
+from modules.common.common import set_logger
+
+logger = set_logger()
+
+# Max concurrent requests of one AsyncAIMSSaaSAPIClient (also its connection pool size)
+AIMS_SAAS_ASYNC_MAX_CONCURRENCY = int(os.getenv("AIMS_SAAS_ASYNC_MAX_CONCURRENCY", "100"))
+
+
+class AsyncAIMSSaaSAPIClient:
+    """
+    asyncio counterpart of AIMSSaaSAPIClient on aiohttp (optional dependency).
+
+    One pooled ClientSession per client; at most max_concurrency requests
+    run at once, and add_articles keeps at most max_in_flight chunks of a
+    call in flight. Tokens come from a TokenManager: by default the one of
+    an internal AIMSSaaSAPIClient, or pass tokens=sync_client.tokens to
+    share a sync client's token. Token requests run in a worker thread, so
+    they never block the event loop.
+
+        async with AsyncAIMSSaaSAPIClient() as client:
+            articles = await asyncio.gather(*(client.get_article(store, a) for a in ids))
+    """
+
+    BASE_URL = AIMSSaaSAPIClient.BASE_URL
+
+    def __init__(self, base_url: str = None, tokens=None, max_concurrency: int = AIMS_SAAS_ASYNC_MAX_CONCURRENCY):
+        if aiohttp is None:
+            raise ImportError("AsyncAIMSSaaSAPIClient needs the aiohttp package")
+        if base_url:
+            self.BASE_URL = base_url
+        self.company = os.getenv("AIMS_SAAS_COMPANY", None)
+        self._token_client = None
+        if tokens is None:
+            self._token_client = AIMSSaaSAPIClient(self.BASE_URL)
+            tokens = self._token_client.tokens
+        self.tokens = tokens
+        self.max_concurrency = max_concurrency
+        self.chunk_sizer = AdaptiveChunkSizer()
+        # Created on first use, inside the running event loop
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._token_client is not None:
+            await asyncio.to_thread(self._token_client.close)
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, ssl=VERIFY_SSL)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=TIMEOUT),
+                headers={"accept": "application/json"},
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def get_access_token(self):
+        """Valid access token; a missing or expiring one is fetched once for all callers."""
+        token = self.tokens.cached_token()
+        if token:
+            return token
+        return await asyncio.to_thread(self.tokens.get_token)
+
+    async def _request(self, method, path, params=None, headers=None, **kwargs):
+        """
+        One authorized request. Returns the response with its body read; a
+        token rejected with 401 is dropped so the next request gets a new one.
+        """
+        session = self._get_session()
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        async with self._semaphore:
+            token = await self.get_access_token()
+            headers = {**(headers or {}), "Authorization": f"Bearer {token}"}
+            async with session.request(
+                method, f"{self.BASE_URL}{path}", params=params, headers=headers, **kwargs
+            ) as response:
+                await response.read()
+        if response.status == 401:
+            self.tokens.invalidate(token)
+        return response
+
+    async def get_article_upload_format(self):
+        response = await self._request(
+            "PUT", "/api/v2/common/articles/upload/format", params={"company": self.company}
+        )
+        if response.status in (200, 202):
+            return await response.json(content_type=None)
+        response.raise_for_status()
+
+    async def _put_articles_chunk(self, params, index, offset, chunk, body):
+        result = ChunkResult(index=index, articles=chunk, offset=offset, nbytes=len(body))
+        start = perf_counter()
+        headers = {"Content-Type": "application/json"}
+        if AIMS_SAAS_GZIP_MIN_BYTES and len(body) >= AIMS_SAAS_GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        try:
+            response = await self._request(
+                "PUT",
+                "/api/v2/common/articles",
+                params=params,
+                headers=headers,
+                data=body,
+                timeout=aiohttp.ClientTimeout(total=AIMS_SAAS_UPLOAD_TIMEOUT),
+            )
+            result.status_code = response.status
+            if not result.ok:
+                result.text = await response.text()
+                result.retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                logger.error(f"Error sending articles chunk {index}: {response.status} → {result.text}")
+        except Exception as e:
+            logger.error(f"HTTP request failed for chunk {index}: {e!r}")
+            result.error = str(e) or type(e).__name__
+        result.elapsed = perf_counter() - start
+        return result
+
+    async def add_articles(
+        self,
+        store_code,
+        articles,
+        chunk_size=5000,
+        max_in_flight=None,
+        on_chunk_done=None,
+        rate_limiter=None,
+    ):
+        """
+        Same contract as AIMSSaaSAPIClient.add_articles. on_chunk_done runs
+        in the event loop, so it should not block for long.
+        """
+        await self.get_access_token()
+        params = {"company": self.company, "store": store_code}
+        max_in_flight = max_in_flight or AIMS_SAAS_MAX_IN_FLIGHT
+
+        if isinstance(articles, EncodedArticles):
+            encoded, items = articles.encoded, articles.keys
+        else:
+            encoded, items = [encode(article) for article in articles], articles
+        result = UploadResult()
+        position = 0
+        index = 0
+        in_flight = set()
+
+        while position < len(items) or in_flight:
+            # Chunks are cut lazily so each one uses the latest size target
+            while position < len(items) and len(in_flight) < max_in_flight:
+                end = self.chunk_sizer.take(encoded, position, chunk_size)
+                body = b"[" + b",".join(encoded[position:end]) + b"]"
+                if rate_limiter:
+                    await asyncio.sleep(rate_limiter.reserve())
+                in_flight.add(
+                    asyncio.ensure_future(
+                        self._put_articles_chunk(params, index, position, items[position:end], body)
+                    )
+                )
+                position = end
+                index += 1
+
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                chunk_result = task.result()
+                record_chunk_result(self.chunk_sizer, chunk_result)
+                result.chunks.append(chunk_result)
+                if on_chunk_done:
+                    on_chunk_done(chunk_result)
+
+        result.chunks.sort(key=lambda chunk: chunk.index)
+        logger.debug(
+            f"Sent {len(items)} articles for store {store_code} in {len(result.chunks)} chunks, "
+            f"{len(result.failed)} failed, chunk target {self.chunk_sizer.target_bytes} bytes"
+        )
+        return result
+
+    async def get_article(self, store_code, article_id):
+        response = await self._request(
+            "GET",
+            "/api/v1/articles/article",
+            params={"company": self.company, "stationCode": store_code, "articleId": article_id},
+        )
+        if response.status not in (200, 202):
+            logger.error(f"Get article {article_id} of store {store_code}: {response.status} {await response.text()}")
+            response.raise_for_status()
+        logger.debug(f"Got {article_id} for store {store_code}")
+        return await response.json(content_type=None)
+
+    async def unlink_label(self, label_code):
+        response = await self._request(
+            "POST", "/api/v1/labels/unlink", params={"company": self.company, "labelCode": label_code}
+        )
+        if response.status in (200, 202):
+            return await response.json(content_type=None)
+        response.raise_for_status()
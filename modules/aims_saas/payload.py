@@ -0,0 +1,111 @@
+import os
+import json
+import hashlib
+
+try:
+    import orjson
+except ImportError:  # optional, faster JSON encoder
+    orjson = None
+
+# JSON encoder for article upload bodies: auto (orjson if installed), orjson or json
+AIMS_JSON_ENCODER = os.getenv("AIMS_JSON_ENCODER", "auto").lower()
+
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def get_encoder(name: str = AIMS_JSON_ENCODER):
+    """Function serializing an object to compact JSON bytes."""
+    if name == "orjson" or (name == "auto" and orjson is not None):
+        if orjson is None:
+            raise ValueError("AIMS_JSON_ENCODER=orjson needs the orjson package")
+        return orjson.dumps
+    if name in ("auto", "json"):
+        return _json_dumps
+    raise ValueError(f"Unknown AIMS_JSON_ENCODER '{name}'. Available: auto, orjson, json")
+
+
+encode = get_encoder()
+
+
+def article_payload(store, article_id, name, vknetto, vkbrutto, ean) -> dict:
+    """AIMS article record of one pending DB row."""
+    return {
+        "store": store,
+        "articleId": article_id,
+        "articleName": name,
+        "eans": [ean] if ean else [],
+        "data": {
+            "STORE_ID": store,
+            "ArtikelNr": article_id,
+            "Bezeichnung": name,
+            "VKNetto1": vknetto,
+            "VKBrutto1": vkbrutto,
+            "EAN1": ean,
+        },
+    }
+
+
+def synced_digest(article_id, name, vknetto, vkbrutto, ean) -> bytes:
+    """Digest of the fields uploaded to AIMS, to compare DB rows with AIMS articles."""
+    values = (article_id, name, vknetto, vkbrutto, ean or "")
+    content = "\x1f".join("" if value is None else str(value) for value in values)
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+
+def article_digest(article: dict) -> bytes:
+    """synced_digest of an article as returned by AIMS."""
+    data = article.get("data") or {}
+    eans = article.get("eans") or [""]
+    return synced_digest(
+        data.get("ArtikelNr", article.get("articleId")),
+        data.get("Bezeichnung", article.get("articleName")),
+        data.get("VKNetto1"),
+        data.get("VKBrutto1"),
+        data.get("EAN1", eans[0]),
+    )
+
+
+class EncodedArticles:
+    """
+    Articles serialized once for upload: encoded[i] is the JSON of the
+    article built from keys[i] = (article_id, change_seq, store), the row
+    format of mark_aims_sent_versions.
+    add_articles cuts chunk bodies from `encoded` and reports each chunk's
+    keys in ChunkResult.articles.
+    """
+
+    __slots__ = ("keys", "encoded")
+
+    def __init__(self, keys=None, encoded=None):
+        self.keys = keys if keys is not None else []
+        self.encoded = encoded if encoded is not None else []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def select(self, chunks) -> "EncodedArticles":
+        """Articles of the given ChunkResults of an upload of self (e.g. failed chunks to retry)."""
+        subset = EncodedArticles()
+        for chunk in chunks:
+            end = chunk.offset + len(chunk.articles)
+            subset.keys.extend(self.keys[chunk.offset:end])
+            subset.encoded.extend(self.encoded[chunk.offset:end])
+        return subset
+
+
+def encode_rows(rows, store: str, dumps=None) -> EncodedArticles:
+    """
+    Serialize pending rows (article_id, Bezeichnung, VKNetto1, VKBrutto1, ean,
+    change_seq) one at a time, so no article dicts outlive their row.
+    """
+    dumps = dumps or encode
+    batch = EncodedArticles()
+    add_key = batch.keys.append
+    add_encoded = batch.encoded.append
+    for article_id, name, vknetto, vkbrutto, ean, change_seq in rows:
+        ean = ean or ""
+        add_key((article_id, change_seq, store))
+        add_encoded(dumps(article_payload(store, article_id, name, vknetto, vkbrutto, ean)))
+    return batch
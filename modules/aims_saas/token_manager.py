@@ -0,0 +1,175 @@
+import os
+import json
+import base64
+import threading
+from time import time
+from modules.common.common import set_logger
+
+logger = set_logger()
+
+# Refresh the access token in the background this many seconds before it expires
+# (at most a quarter of its lifetime)
+AIMS_TOKEN_REFRESH_BEFORE = float(os.getenv("AIMS_TOKEN_REFRESH_BEFORE", "300"))
+# Callers refresh synchronously if less validity than this is left (seconds)
+AIMS_TOKEN_MIN_VALIDITY = float(os.getenv("AIMS_TOKEN_MIN_VALIDITY", "30"))
+
+# Lifetime assumed if a token response has neither expires_in nor a JWT exp claim
+DEFAULT_TOKEN_LIFETIME = 3600
+# Max wait before retrying a failed background refresh (seconds)
+_MAX_RETRY_DELAY = 300
+
+
+def _jwt_expiry(token):
+    """exp claim of a JWT access token, None if it is not a JWT."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def token_expiry(token_data: dict, now: float) -> float:
+    """Unix time a token from a token response expires: expires_in, JWT exp or default."""
+    try:
+        expires_in = float(token_data.get("expires_in") or 0)
+    except (TypeError, ValueError):
+        expires_in = 0
+    if expires_in > 0:
+        return now + expires_in
+    return _jwt_expiry(token_data.get("access_token")) or now + DEFAULT_TOKEN_LIFETIME
+
+
+class TokenManager:
+    """
+    One AIMS access token shared by all threads of a client.
+
+    get_token() returns the cached token while it is valid. If it is missing
+    or about to expire, one caller fetches a new one while concurrent callers
+    wait for that result instead of requesting their own (single flight).
+    A background thread refreshes before expiry with the refresh token,
+    falling back to a username/password login. invalidate(token) drops a
+    token the server rejected (401).
+
+    request_token(refresh_token) does the HTTP call and returns the token
+    response message; refresh_token is None for a password login.
+    """
+
+    def __init__(
+        self,
+        request_token,
+        refresh_before=AIMS_TOKEN_REFRESH_BEFORE,
+        min_validity=AIMS_TOKEN_MIN_VALIDITY,
+        background=True,
+    ):
+        self._request_token = request_token
+        self.refresh_before = refresh_before
+        self.min_validity = min_validity
+        self.background = background
+        # (access_token, refresh_token, expires_at, issued_at), replaced as a whole
+        self._state = (None, None, 0.0, 0.0)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._retry_at = 0.0
+        self._failures = 0
+        self._closed = False
+        self._thread = None
+
+    @property
+    def access_token(self):
+        return self._state[0]
+
+    @property
+    def refresh_token(self):
+        return self._state[1]
+
+    @property
+    def expires_at(self):
+        return self._state[2]
+
+    def _valid(self, state) -> bool:
+        return bool(state[0]) and time() < state[2] - self.min_validity
+
+    def cached_token(self):
+        """The current token if it is still valid, else None. Never blocks."""
+        state = self._state
+        return state[0] if self._valid(state) else None
+
+    def get_token(self) -> str:
+        state = self._state
+        if self._valid(state):
+            return state[0]
+        with self._lock:
+            state = self._state
+            if self._valid(state):
+                # refreshed by another caller while we waited
+                return state[0]
+            return self._refresh("expired" if state[0] else "login")
+
+    def invalidate(self, token: str):
+        """Forget `token` after the server rejected it, unless it was replaced already."""
+        with self._lock:
+            access_token, refresh_token, _, _ = self._state
+            if token and token == access_token:
+                self._state = (None, refresh_token, 0.0, 0.0)
+                logger.info("Access token rejected by AIMS, fetching a new one.")
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _refresh(self, reason: str) -> str:
+        """Fetch a new token, with the refresh token if there is one. Caller holds self._lock."""
+        refresh_token = self._state[1]
+        data = None
+        if refresh_token:
+            try:
+                data = self._request_token(refresh_token)
+            except Exception as e:
+                logger.warning(f"Access token refresh failed, logging in again: {e}")
+        if data is None:
+            data = self._request_token(None)
+
+        now = time()
+        expires_at = token_expiry(data, now)
+        self._state = (data["access_token"], data.get("refresh_token") or refresh_token, expires_at, now)
+        self._failures = 0
+        self._retry_at = 0.0
+        logger.info(f"Obtained new access token ({reason}), valid for {expires_at - now:.0f} s.")
+        self._start_background()
+        return data["access_token"]
+
+    def _refresh_at(self) -> float:
+        _, _, expires_at, issued_at = self._state
+        return expires_at - min(self.refresh_before, (expires_at - issued_at) / 4)
+
+    def _start_background(self):
+        if not self.background or self._closed:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="aims-token", daemon=True)
+            self._thread.start()
+        else:
+            # token changed: recompute the next refresh time
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.clear()
+            # No token (e.g. invalidated): the next caller logs in and wakes us
+            delay = max(self._refresh_at(), self._retry_at) - time() if self._state[0] else None
+            if self._wakeup.wait(delay):
+                continue
+            with self._lock:
+                if self._closed or not self._state[0] or time() < self._refresh_at():
+                    continue
+                try:
+                    self._refresh("proactive")
+                except Exception as e:
+                    # callers refresh themselves once the token is about to expire
+                    self._failures += 1
+                    delay = min(10 * 2 ** self._failures, _MAX_RETRY_DELAY)
+                    self._retry_at = time() + delay
+                    logger.warning(f"Background token refresh failed, retrying in {delay} s: {e}")
@@ -0,0 +1,93 @@
+import os
+import hashlib
+
+try:
+    import xxhash
+except ImportError:  # optional, faster non-cryptographic hashes
+    xxhash = None
+
+# Row fingerprint algorithm used for change detection
+FINGERPRINT_ALGO = os.getenv("FINGERPRINT_ALGO", "blake2b").lower()
+
+# Algorithm of hash_code values written before fingerprints were configurable
+LEGACY_FINGERPRINT_ALGO = "sha256"
+
+# CSV columns sent to AIMS by AIMSSyncService._prepare_articles_payload
+SYNCED_COLUMNS = ["ArtikelNr", "Bezeichnung", "VKNetto1", "VKBrutto1", "EAN1"]
+
+
+def _parse_columns(value: str):
+    """Comma separated column names; "*" means all columns."""
+    if value.strip() == "*":
+        return None
+    return [c.strip() for c in value.split(",") if c.strip()]
+
+
+# Only changes in these columns mark an article for AIMS upload ("*" = all)
+HASH_COLUMNS = _parse_columns(os.getenv("HASH_COLUMNS", ",".join(SYNCED_COLUMNS)))
+
+
+def _sha256_hex(content: bytes):
+    return hashlib.sha256(content).hexdigest()
+
+
+def _blake2b_128(content: bytes):
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+FINGERPRINT_ALGORITHMS = {
+    # legacy: 64-char hex TEXT, values joined with "||"
+    "sha256": _sha256_hex,
+    # compact 16-byte BLOB digests
+    "blake2b": _blake2b_128,
+}
+
+if xxhash is not None:
+    FINGERPRINT_ALGORITHMS["xxh3_128"] = xxhash.xxh3_128_digest
+    FINGERPRINT_ALGORITHMS["xxh3_64"] = xxhash.xxh3_64_digest
+
+
+def _check_algorithm(algorithm: str):
+    if algorithm not in FINGERPRINT_ALGORITHMS:
+        raise ValueError(
+            f"Unknown or unavailable fingerprint algorithm '{algorithm}'. "
+            f"Available: {', '.join(FINGERPRINT_ALGORITHMS)}"
+        )
+
+
+class RowFingerprinter:
+    """
+    Fingerprint CSV rows (lists of values) for change detection.
+    The column positions are resolved once per file: the configured columns
+    in their configured order (missing ones hash as empty), or all columns
+    sorted by header name when columns is None.
+    """
+
+    def __init__(
+        self, header: list, algorithm: str = FINGERPRINT_ALGO, columns=HASH_COLUMNS
+    ):
+        _check_algorithm(algorithm)
+        self.algorithm = algorithm
+        self._digest = FINGERPRINT_ALGORITHMS[algorithm]
+        # legacy hashes must stay byte-identical to the old "||" join
+        self._separator = "||" if algorithm == LEGACY_FINGERPRINT_ALGO else "\x1f"
+        if columns is None:
+            self._order = sorted(range(len(header)), key=header.__getitem__)
+        else:
+            header_index = {name: i for i, name in enumerate(header)}
+            self._order = [header_index.get(name) for name in columns]
+
+    def __call__(self, row: list):
+        size = len(row)
+        content = self._separator.join(
+            row[i].strip() if i is not None and i < size else "" for i in self._order
+        )
+        return self._digest(content.encode("utf-8"))
+
+
+def fingerprint_signature(algorithm: str = FINGERPRINT_ALGO, columns=HASH_COLUMNS) -> str:
+    """Identifies how stored hash_code values were computed (used for migrations)."""
+    _check_algorithm(algorithm)
+    if columns is None:
+        return algorithm
+    return f"{algorithm}:{','.join(columns)}"
@@ -0,0 +1,243 @@
+import os
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from modules.common.common import set_logger
+
+logger = set_logger()
+
+# Port of the Prometheus text-format endpoint /metrics (0 = disabled)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Interface the endpoint listens on
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Default histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_REGISTRY = []
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _CallbackMetric(_Metric):
+    """Counter / gauge whose value can also be read from a callback at scrape time."""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set_function(self, function):
+        """Report function() on every scrape (metric without labels)."""
+        self._function = function
+
+    def _samples(self):
+        if self._function is None:
+            yield from super()._samples()
+            return
+        try:
+            yield f"{self.name} {_format_value(self._function())}"
+        except Exception as e:
+            logger.debug(f"Metric {self.name} callback failed: {e}")
+
+
+class Counter(_CallbackMetric):
+    """Monotonically increasing count; incremented or read from a callback at scrape time."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_CallbackMetric):
+    """Value that goes up and down; set directly or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        for key, (counts, total, count) in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in _REGISTRY) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Serve /metrics from a daemon thread. Returns the server, or None if disabled."""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.error(f"Metrics endpoint disabled, cannot listen on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Metrics endpoint listening on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+# CSV ingest
+CSV_ROWS = Counter(
+    "aims_sync_csv_rows_total",
+    "CSV rows by result (parsed, skipped, inserted, updated, unchanged)",
+    ["result"],
+)
+CSV_LAST_FILE_ROWS = Gauge(
+    "aims_sync_csv_last_file_rows",
+    "Rows of the most recently processed CSV file by result",
+    ["result"],
+)
+CSV_FILES = Counter("aims_sync_csv_files_total", "Finalized CSV files by outcome", ["outcome"])
+DB_UPSERT_SECONDS = Histogram(
+    "aims_sync_db_upsert_seconds", "Duration of one bulk upsert transaction"
+)
+PIPELINE_QUEUE_DEPTH = Gauge(
+    "aims_sync_pipeline_queue_depth", "Items waiting for the AIMS uploader thread"
+)
+AIMS_PENDING_ARTICLES = Gauge(
+    "aims_sync_pending_articles", "Articles waiting for upload to AIMS (aims_flag=1, all stores)"
+)
+
+# AIMS
+AIMS_REQUEST_SECONDS = Histogram(
+    "aims_sync_aims_request_seconds",
+    "AIMS article upload request latency per chunk by HTTP status (error = no response)",
+    ["status"],
+)
+AIMS_UPLOADED_ARTICLES = Counter(
+    "aims_sync_aims_uploaded_articles_total", "Articles in chunks accepted by AIMS"
+)
+AIMS_UPLOADED_BYTES = Counter(
+    "aims_sync_aims_uploaded_bytes_total", "Serialized article bytes sent to AIMS (before gzip)"
+)
+AIMS_TOKEN_REFRESHES = Counter(
+    "aims_sync_aims_token_refreshes_total",
+    "Access tokens obtained from AIMS by grant (password, refresh_token)",
+    ["grant"],
+)
+AIMS_SYNC_SECONDS = Histogram(
+    "aims_sync_aims_sync_seconds", "Duration of one sync of all pending articles by result", ["result"]
+)
+AIMS_CHUNK_TARGET_BYTES = Gauge(
+    "aims_sync_aims_chunk_target_bytes", "Current serialized byte target of adaptive upload chunks"
+)
+AIMS_CHUNK_CEILING_BYTES = Gauge(
+    "aims_sync_aims_chunk_ceiling_bytes", "Upper bound of the chunk target (lowered after 413 responses)"
+)
+AIMS_CHUNK_GROWS = Counter(
+    "aims_sync_aims_chunk_grows_total", "Times the chunk target grew after fast uploads"
+)
+AIMS_CHUNK_SHRINKS = Counter(
+    "aims_sync_aims_chunk_shrinks_total", "Times the chunk target shrank after slow or failed uploads"
+)
+
+# Daemon
+LOOP_SECONDS = Histogram(
+    "aims_sync_loop_iteration_seconds",
+    "Time per run_sync_daemon loop iteration by phase (wait = waiting for files, work = maintenance and ingest)",
+    ["phase"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600),
+)
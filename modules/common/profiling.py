@@ -0,0 +1,207 @@
+import os
+import json
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+from time import perf_counter, strftime
+from env import strtobool
+from modules.common.common import set_logger
+
+logger = set_logger()
+
+# Stage report <archived csv>.timings.json per file: off, basic (per batch) or
+# detailed (also splits read / parse+hash / skip per row, costs ~15% ingest speed)
+PROFILE_STAGES = os.getenv("PROFILE_STAGES", "basic").lower()
+# cProfile the first ingest and the first AIMS sync after startup
+PROFILE_CYCLE = strtobool(os.getenv("PROFILE_CYCLE", "false"))
+# Where PROFILE_CYCLE writes .prof files and their text summaries
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("logs", "profiles"))
+
+
+class _Span:
+    __slots__ = ("items",)
+
+    def __init__(self, items):
+        self.items = items
+
+
+class StageTimer:
+    """
+    Accumulates self time, item and call counts per named stage.
+    Spans nest per thread: time spent in an inner span is not counted for
+    the outer one. Thread-safe.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.started = perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add(self, name: str, seconds: float, items: int = 0, calls: int = 1):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = [0.0, 0, 0]
+            stage[0] += seconds
+            stage[1] += items
+            stage[2] += calls
+
+    @contextmanager
+    def span(self, name: str, items: int = 0):
+        """Time a block; set `span.items` inside the block if the count is known later."""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        span = _Span(items)
+        stack.append(0.0)
+        start = perf_counter()
+        try:
+            yield span
+        finally:
+            elapsed = perf_counter() - start
+            inner = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.add(name, elapsed - inner, span.items)
+
+    def summary(self) -> dict:
+        with self._lock:
+            stages = {name: list(values) for name, values in self.stages.items()}
+        return {
+            "wall_seconds": round(perf_counter() - self.started, 4),
+            "stages": {
+                name: {
+                    "seconds": round(seconds, 4),
+                    "items": items,
+                    "calls": calls,
+                    "items_per_sec": round(items / seconds) if items and seconds > 0 else None,
+                }
+                for name, (seconds, items, calls) in stages.items()
+            },
+        }
+
+
+def merge_summaries(summaries: list) -> dict:
+    """Add up several StageTimer summaries (e.g. all syncs covering one file)."""
+    stages = {}
+    wall = 0.0
+    for summary in summaries:
+        wall += summary["wall_seconds"]
+        for name, stage in summary["stages"].items():
+            total = stages.setdefault(name, [0.0, 0, 0])
+            total[0] += stage["seconds"]
+            total[1] += stage["items"]
+            total[2] += stage["calls"]
+    return {
+        "wall_seconds": round(wall, 4),
+        "stages": {
+            name: {
+                "seconds": round(seconds, 4),
+                "items": items,
+                "calls": calls,
+                "items_per_sec": round(items / seconds) if items and seconds > 0 else None,
+            }
+            for name, (seconds, items, calls) in stages.items()
+        },
+    }
+
+
+class TimedIterator:
+    """
+    Wraps an iterator and adds up the time spent producing items, including
+    time spent in any iterator it pulls from.
+    """
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.seconds = 0.0
+        self.items = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = perf_counter()
+        try:
+            item = next(self._iterator)
+        finally:
+            self.seconds += perf_counter() - start
+        self.items += 1
+        return item
+
+    def close(self):
+        close = getattr(self._iterator, "close", None)
+        if close:
+            close()
+
+
+def write_timing_report(csv_path: str, report: dict):
+    """Write report as <csv name>.timings.json next to the (archived or failed) CSV."""
+    if PROFILE_STAGES == "off" or not report:
+        return
+    report_path = os.path.splitext(csv_path)[0] + ".timings.json"
+    try:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, separators=(",", ":"))
+    except OSError as e:
+        logger.warning(f"Could not write timing report {report_path}: {e}")
+
+
+_profiled = set()
+_profiled_lock = threading.Lock()
+# Only one cProfile profiler can be active per process
+_profile_active = False
+
+
+def cycle_profile_pending(label: str) -> bool:
+    """True if PROFILE_CYCLE is set, `label` was not profiled yet and no profile is running."""
+    with _profiled_lock:
+        return PROFILE_CYCLE and label not in _profiled and not _profile_active
+
+
+def _release_profile():
+    global _profile_active
+    with _profiled_lock:
+        _profile_active = False
+
+
+@contextmanager
+def profile_once(label: str):
+    """
+    Run the block under cProfile the first time `label` is seen when
+    PROFILE_CYCLE is set (only the calling thread is profiled). If another
+    block is being profiled, this one runs unprofiled and `label` stays due.
+    """
+    global _profile_active
+    with _profiled_lock:
+        armed = PROFILE_CYCLE and label not in _profiled and not _profile_active
+        if armed:
+            _profiled.add(label)
+            _profile_active = True
+    if not armed:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # e.g. a debugger or another profiler owns the profiling hook
+        logger.warning(f"cProfile of {label} skipped: {e}")
+        _release_profile()
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _release_profile()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, f"{label}_{strftime('%Y%m%d_%H%M%S')}")
+        profiler.dump_stats(base + ".prof")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(40)
+        logger.info(f"cProfile of {label} written to {base}.prof")
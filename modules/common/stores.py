@@ -0,0 +1,26 @@
+import os
+import re
+
+# Store for CSV rows that do not name one (also assigned to pre multi-store data)
+DEFAULT_STORE = os.getenv("AIMS_SAAS_STORE") or "KL001"
+# Optional CSV column holding the store code of each row (e.g. Filiale)
+CSV_STORE_COLUMN = os.getenv("CSV_STORE_COLUMN", "").strip()
+# Optional regex matched against the CSV file name; the group named "store"
+# (or the first group) is the store code, e.g. ^articles_(?P<store>[A-Z]{2}\d{3})
+CSV_STORE_PATTERN = os.getenv("CSV_STORE_PATTERN", "").strip()
+
+
+def store_from_filename(filename: str, pattern: str = CSV_STORE_PATTERN, default: str = DEFAULT_STORE) -> str:
+    """Store code for a CSV file name, or the default store if the pattern does not match."""
+    if not pattern:
+        return default
+    match = re.search(pattern, os.path.basename(filename))
+    if not match:
+        return default
+    if "store" in match.groupdict():
+        store = match.group("store")
+    elif match.groups():
+        store = match.group(1)
+    else:
+        store = match.group(0)
+    return store.strip() or default
@@ -1,5 +1,6 @@
 import os
 import datetime
+from itertools import islice
 
 def is_zip(path=""):
     return path.lower().endswith(".zip")
@@ -19,4 +20,11 @@ def append_timestamp(filename):
     """Append current timestamp to a filename before the extension."""
     name, ext = os.path.splitext(filename)
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    return f"{name}_{timestamp}{ext}"
\ No newline at end of file
+    return f"{name}_{timestamp}{ext}"
+
+
+def batched(iterable, size):
+    """Yield lists of up to `size` items from any iterable (lazily)."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Benchmark row fingerprinting throughput: the old DictReader + SHA-256 hex
+hasher against the RowFingerprinter strategies on a synthetic CSV feed.
+
+Usage: python scripts/bench_fingerprint.py [--rows 1000000] [--keep FILE]
+"""
+
+import os
+import sys
+import csv
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.common.fingerprint import FINGERPRINT_ALGORITHMS, RowFingerprinter
+
+HEADER = [
+    "ArtikelNr",
+    "Bezeichnung",
+    "VKNetto1",
+    "VKBrutto1",
+    "EAN1",
+    "Warengruppe",
+    "Lieferant",
+    "Einheit",
+]
+
+
+def generate_csv(path: str, rows: int):
+    rnd = random.Random(42)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(HEADER)
+        for i in range(rows):
+            net = rnd.randint(10, 99999) / 100
+            writer.writerow(
+                [
+                    f"ANR{i:010d}",
+                    f"Artikel {rnd.randint(0, 10**6)} Bezeichnung",
+                    f"{net:.2f}".replace(".", ","),
+                    f"{net * 1.19:.2f}".replace(".", ","),
+                    f"{rnd.randint(10**12, 10**13 - 1)}",
+                    f"WG{rnd.randint(1, 500)}",
+                    f"L{rnd.randint(1, 80)}",
+                    "Stk",
+                ]
+            )
+
+
+def bench_legacy(path: str) -> int:
+    """Old CSVLoader._generate_row_hash over csv.DictReader rows."""
+    count = 0
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f, delimiter=";"):
+            content = "||".join(str(v).strip() for _, v in sorted(row.items()))
+            hashlib.sha256(content.encode("utf-8")).hexdigest()
+            count += 1
+    return count
+
+
+def bench_parse_only(path: str) -> int:
+    count = 0
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f, delimiter=";")
+        next(reader)
+        for _ in reader:
+            count += 1
+    return count
+
+
+def bench_fingerprinter(path: str, algorithm: str) -> int:
+    count = 0
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f, delimiter=";")
+        fingerprint = RowFingerprinter(next(reader), algorithm)
+        for row in reader:
+            fingerprint(row)
+            count += 1
+    return count
+
+
+def report(label: str, func, *args):
+    start = time.perf_counter()
+    rows = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {rows:>10} rows  {elapsed:8.2f} s  {rows / elapsed:>12,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--keep", help="write the synthetic CSV here and keep it")
+    args = parser.parse_args()
+
+    path = args.keep or os.path.join(tempfile.mkdtemp(), "bench_fingerprint.csv")
+    print(f"Generating {args.rows} rows -> {path}")
+    generate_csv(path, args.rows)
+
+    try:
+        report("csv.reader (parse only)", bench_parse_only, path)
+        report("legacy DictReader+sha256", bench_legacy, path)
+        for algorithm in FINGERPRINT_ALGORITHMS:
+            report(f"reader+{algorithm}", bench_fingerprinter, path, algorithm)
+    finally:
+        if not args.keep:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Micro-benchmark of per-request latency against a local HTTPS AIMS stub:
+module-level requests calls (new TCP + TLS handshake per request, the old
+client behaviour) versus the client's pooled keep-alive session.
+
+Usage: python scripts/bench_http_session.py [--requests 200]
+Needs the cryptography package to create a throwaway self-signed certificate.
+"""
+
+import os
+import sys
+import time
+import datetime
+import argparse
+import tempfile
+import ipaddress
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from benchmarks.aims_stub_server import AIMSStubServer
+from modules.aims_saas.aims_saas_api_client import AIMSSaaSAPIClient
+
+
+def create_self_signed_cert(directory: str):
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]),
+            critical=False,
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    certfile = os.path.join(directory, "stub.crt")
+    keyfile = os.path.join(directory, "stub.key")
+    with open(certfile, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(keyfile, "wb") as f:
+        f.write(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+    return certfile, keyfile
+
+
+def measure(label: str, func, count: int):
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{label:<34} mean {statistics.mean(timings):7.2f} ms  "
+        f"median {statistics.median(timings):7.2f} ms  p95 {p95:7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    certfile, keyfile = create_self_signed_cert(tempfile.mkdtemp())
+    store, article_id = "KL001", "A1"
+
+    with AIMSStubServer(certfile=certfile, keyfile=keyfile) as stub:
+        client = AIMSSaaSAPIClient(base_url=stub.url)
+        client.session.verify = certfile
+        client.session.trust_env = False  # ignore REQUESTS_CA_BUNDLE / proxies
+        client.add_articles(store, [{"store": store, "articleId": article_id, "data": {}}])
+
+        endpoint = f"{stub.url}/api/v1/articles/article"
+        headers = {"Authorization": f"Bearer {client.access_token}"}
+        params = {"company": client.company, "stationCode": store, "articleId": article_id}
+
+        measure(
+            "requests.get (new connection)",
+            lambda: requests.get(
+                endpoint, headers=headers, params=params, verify=certfile, timeout=30
+            ),
+            args.requests,
+        )
+        measure(
+            "client.get_article (pooled session)",
+            lambda: client.get_article(store, article_id),
+            args.requests,
+        )
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark CSV parsing throughput with 1, 2, 4 and 8 parse workers on a
+synthetic semicolon-delimited feed: parsing + fingerprinting alone, and
+optionally the full CSVLoader.process_csv load into a fresh SQLite DB.
+
+Usage: python scripts/bench_parallel_csv.py [--rows 1000000] [--workers 1 2 4 8] [--with-db] [--keep FILE]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_fingerprint import generate_csv
+from db.database_manager import DatabaseManager
+from modules.common.stores import DEFAULT_STORE
+from services import csv_process
+from services.csv_process import CSVLoader
+
+
+def parse_only(loader: CSVLoader, path: str, workers: int) -> int:
+    rows = loader._read_csv(path)
+    header = next(rows)
+    if workers > 1:
+        rows.close()
+        parsed = loader._parse_rows_parallel(path, header, DEFAULT_STORE, workers)
+    else:
+        parsed = loader._parse_rows(header, rows, DEFAULT_STORE)
+    count = 0
+    for _ in parsed:
+        count += 1
+    return count
+
+
+def full_load(path: str, workers: int, work_dir: str) -> int:
+    db_dir = tempfile.mkdtemp(dir=work_dir)
+    db = DatabaseManager(os.path.join(db_dir, "bench.db"))
+    try:
+        loader = CSVLoader(db, db_dir, db_dir, db_dir)
+        loader.parse_workers = workers
+        if not loader.process_csv(path):
+            raise RuntimeError("process_csv failed")
+        return loader.last_metrics["rows"]
+    finally:
+        db.close()
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+
+def report(label: str, workers: int, rows: int, elapsed: float, baseline: float):
+    speedup = f"{baseline / elapsed:5.2f}x" if baseline else "  1.00x"
+    print(f"{label:<6} {workers:>2} workers  {rows / elapsed:>12,.0f} rows/s  {elapsed:7.2f} s  {speedup}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--with-db", action="store_true", help="also time process_csv into SQLite")
+    parser.add_argument("--keep", help="write the feed to this path and keep it")
+    args = parser.parse_args()
+
+    # Parallel mode for any file size
+    csv_process.CSV_PARALLEL_MIN_BYTES = 0
+
+    work_dir = tempfile.mkdtemp()
+    path = args.keep or os.path.join(work_dir, "feed.csv")
+    try:
+        start = time.perf_counter()
+        generate_csv(path, args.rows)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(
+            f"Generated {args.rows:,} rows ({size_mb:.1f} MiB) in {time.perf_counter() - start:.1f} s, "
+            f"{os.cpu_count()} CPUs, ranges of {csv_process.CSV_PARSE_RANGE_BYTES // 1024} KiB"
+        )
+
+        db = DatabaseManager(os.path.join(work_dir, "parse.db"))
+        loader = CSVLoader(db, work_dir, work_dir, work_dir)
+        baseline = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            rows = parse_only(loader, path, workers)
+            elapsed = time.perf_counter() - start
+            report("parse", workers, rows, elapsed, baseline)
+            baseline = baseline or elapsed
+        db.close()
+
+        if args.with_db:
+            baseline = None
+            for workers in args.workers:
+                start = time.perf_counter()
+                rows = full_load(path, workers, work_dir)
+                elapsed = time.perf_counter() - start
+                report("load", workers, rows, elapsed, baseline)
+                baseline = baseline or elapsed
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Export, import or diff columnar catalog snapshots (one file per store, see
+db/snapshot.py). export writes the stores' articles from the DB, import
+restores a store from a snapshot (--pending re-uploads the whole store to
+AIMS on the next sync) and diff compares a CSV with a snapshot without
+importing it. A running daemon notices an import and reloads its hash index
+before its next file. Uses DB_PATH and CSV_SNAPSHOT_DIR like app.py.
+
+Usage: python scripts/catalog_snapshot.py export [--store KL001 ...]
+       python scripts/catalog_snapshot.py import FILE [--pending]
+       python scripts/catalog_snapshot.py diff CSV [--snapshot FILE] [--ids]
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import ARCHIVED_DIR, DB_PATH, FAILED_DIR, INPUT_DIR
+from db.database_manager import DatabaseManager
+from db.snapshot import CatalogSnapshot, snapshot_path
+from modules.common.stores import store_from_filename
+from services.csv_process import CSV_SNAPSHOT_DIR, CSVLoader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--dir", default=CSV_SNAPSHOT_DIR, help="snapshot directory (default: CSV_SNAPSHOT_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write snapshots of stores")
+    export.add_argument("--store", nargs="+", help="stores to export (default: all stores in the DB)")
+    restore = commands.add_parser("import", help="replace a store's articles with a snapshot")
+    restore.add_argument("file")
+    restore.add_argument("--pending", action="store_true", help="flag all articles for upload to AIMS")
+    diff = commands.add_parser("diff", help="compare a CSV with a snapshot")
+    diff.add_argument("csv")
+    diff.add_argument("--snapshot", help="snapshot file (default: the CSV store's file in --dir)")
+    diff.add_argument("--ids", action="store_true", help="also print the new and changed article ids")
+    args = parser.parse_args()
+
+    if not args.dir and (args.command == "export" or (args.command == "diff" and not args.snapshot)):
+        parser.error("set CSV_SNAPSHOT_DIR or pass --dir")
+    db = DatabaseManager(args.db)
+    try:
+        if args.command == "export":
+            os.makedirs(args.dir, exist_ok=True)
+            for store in args.store or db.stores():
+                db.export_snapshot(snapshot_path(args.dir, store), store)
+        elif args.command == "import":
+            count = db.import_snapshot(args.file, args.pending)
+            print(f"Imported {count} articles{' (pending for AIMS)' if args.pending else ''}")
+        else:
+            path = args.snapshot or snapshot_path(args.dir, store_from_filename(args.csv))
+            loader = CSVLoader(db=db, input_dir=INPUT_DIR, archive_dir=ARCHIVED_DIR, failed_dir=FAILED_DIR)
+            with CatalogSnapshot(path) as snapshot:
+                result = loader.diff_csv(args.csv, snapshot)
+            print(
+                f"{result['rows']} rows: {result['new']} new, {result['changed']} changed, "
+                f"{result['unchanged']} unchanged, {result['removed']} removed "
+                f"({result['repeated']} repeated rows, {result['other_stores']} rows of other stores ignored)"
+            )
+            if args.ids:
+                for article_id in result["new_ids"]:
+                    print(f"new {article_id}")
+                for article_id in result["changed_ids"]:
+                    print(f"changed {article_id}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
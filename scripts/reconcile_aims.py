@@ -0,0 +1,54 @@
+"""
+Reconcile the local articles table with AIMS: list each store's articles
+from AIMS, compare them with the articles the DB marks as synced and flag
+differing or missing ones for upload (instead of re-uploading everything
+after an incident). Uses DB_PATH and the AIMS_SAAS_* settings like app.py.
+
+Usage: python scripts/reconcile_aims.py [--store KL001 ...] [--dry-run] [--sync]
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import DB_PATH, FAILED_DIR
+from db.database_manager import DatabaseManager
+from services.load_artciles import AIMSSyncService
+from services.reconcile import AIMSReconciler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--store", nargs="+", help="stores to reconcile (default: all stores in the DB)")
+    parser.add_argument("--dry-run", action="store_true", help="only report, flag nothing")
+    parser.add_argument("--sync", action="store_true", help="upload flagged articles right away")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    aims_sync = AIMSSyncService(db=db, failed_dir=FAILED_DIR)
+    try:
+        results = AIMSReconciler(db, aims_sync.client).reconcile(args.store, args.dry_run)
+        print(f"{'store':<12} {'local':>9} {'remote':>9} {'matched':>9} {'differ':>8} {'missing':>8} {'extra':>8} {'flagged':>8}")
+        for r in results:
+            if "error" in r:
+                print(f"{r['store']:<12} failed: {r['error']}")
+                continue
+            print(
+                f"{r['store']:<12} {r['local']:>9} {r['remote']:>9} {r['matched']:>9} "
+                f"{r['mismatched']:>8} {r['missing']:>8} {r['extra']:>8} {r['flagged']:>8}"
+            )
+        if args.sync and any(r.get("flagged") for r in results):
+            success, sent = aims_sync.sync_pending()
+            print(f"Uploaded {sent} articles{'' if success else ' (some stores failed)'}")
+        failed = any("error" in r for r in results)
+    finally:
+        aims_sync.close()
+        db.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,106 @@
+import io
 import os
 import csv
-import hashlib
 import shutil
-from db.database_manager import DatabaseManager
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from db.database_manager import DatabaseManager, compact_hash
+from db.snapshot import CatalogSnapshot, snapshot_path
 from modules.common.common import set_logger
+from modules.common.metrics import CSV_LAST_FILE_ROWS, CSV_ROWS
+from modules.common.profiling import PROFILE_STAGES, StageTimer, TimedIterator
+from modules.common.stores import CSV_STORE_COLUMN, store_from_filename
+from modules.common.fingerprint import (
+    FINGERPRINT_ALGO,
+    HASH_COLUMNS,
+    LEGACY_FINGERPRINT_ALGO,
+    RowFingerprinter,
+    fingerprint_signature,
+)
+from modules.lib import batched
 
 logger = set_logger()
 
+# Number of parsed rows written to the DB per transaction
+CSV_BATCH_SIZE = int(os.getenv("CSV_BATCH_SIZE", "5000"))
+# Worker processes parsing and hashing large CSVs (1 = parse in the calling thread)
+CSV_PARSE_WORKERS = int(os.getenv("CSV_PARSE_WORKERS", "1"))
+# Files smaller than this are always parsed in the calling thread (bytes)
+CSV_PARALLEL_MIN_BYTES = int(os.getenv("CSV_PARALLEL_MIN_BYTES", str(64 * 1024 * 1024)))
+# Size of the byte ranges handed to parse workers
+CSV_PARSE_RANGE_BYTES = int(os.getenv("CSV_PARSE_RANGE_BYTES", str(8 * 1024 * 1024)))
+# Directory of per-store catalog snapshots seeding the hash index (empty = off)
+CSV_SNAPSHOT_DIR = os.getenv("CSV_SNAPSHOT_DIR", "")
+# Max stores kept in the in-memory hash index, least recently used are dropped (0 = no limit)
+CSV_HASH_INDEX_STORES = int(os.getenv("CSV_HASH_INDEX_STORES", "0"))
+
+
+def parse_rows(header: list, rows, file_store: str, fingerprint_algo, hash_columns, store_column):
+    """
+    Validate and hash rows lazily.
+    Yields tuples (article_id, Bezeichnung, VKNetto1, VKBrutto1, ean, hash_code, store).
+    Rows without a value in the store column belong to file_store.
+    """
+    header_index = {name: i for i, name in enumerate(header)}
+    fingerprint = RowFingerprinter(header, fingerprint_algo, hash_columns)
+    idx_article = header_index.get("ArtikelNr")
+    idx_name = header_index.get("Bezeichnung")
+    idx_net = header_index.get("VKNetto1")
+    idx_gross = header_index.get("VKBrutto1")
+    idx_ean = header_index.get("EAN1")
+    idx_store = header_index.get(store_column) if store_column else None
+
+    def field(row, idx):
+        return row[idx].strip() if idx is not None and idx < len(row) else ""
+
+    for row in rows:
+        article_id = field(row, idx_article)
+        if not article_id:
+            logger.warning(f"Skipping invalid row: {row}")
+            continue
+
+        yield (
+            article_id,
+            field(row, idx_name),
+            field(row, idx_net),
+            field(row, idx_gross),
+            field(row, idx_ean),
+            fingerprint(row),
+            field(row, idx_store) or file_store,
+        )
+
+
+def split_byte_ranges(file_path: str, start: int, range_bytes: int) -> list:
+    """
+    Split a file from `start` into (start, end) byte ranges of roughly
+    range_bytes, each ending on a line boundary.
+    """
+    size = os.path.getsize(file_path)
+    ranges = []
+    with open(file_path, "rb") as f:
+        while start < size:
+            end = min(start + range_bytes, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _parse_range(file_path, start, end, header, file_store, fingerprint_algo, hash_columns, store_column):
+    """Worker: parse and hash one byte range of a CSV, returns a list of parsed rows."""
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+    reader = csv.reader(io.StringIO(text, newline=""), delimiter=";")
+    rows = (row for row in reader if any(v.strip() for v in row))
+    return list(
+        parse_rows(header, rows, file_store, fingerprint_algo, hash_columns, store_column)
+    )
+
 
 class CSVLoader:
     """Handles CSV reading, hashing rows, and DB upserts."""
@@ -22,15 +116,230 @@ class CSVLoader:
         for d in [self.input_dir, self.archive_dir, self.failed_dir]:
             os.makedirs(d, exist_ok=True)
 
-    def _generate_row_hash(self, row: dict) -> str:
-        """Generate SHA256 hash for CSV row. Includes all columns (sorted by key)."""
-        content = "||".join(str(v).strip() for _, v in sorted(row.items()))
-        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+        self.fingerprint_algo = FINGERPRINT_ALGO
+        # Significant columns: only changes here mark an article for AIMS upload
+        self.hash_columns = HASH_COLUMNS
+        self.db.ensure_fingerprint(
+            fingerprint_signature(self.fingerprint_algo, self.hash_columns),
+            fingerprint_signature(LEGACY_FINGERPRINT_ALGO, None),
+        )
+
+        # Per-row store column; falls back to the store of the file name
+        self.store_column = CSV_STORE_COLUMN
+        self.parse_workers = CSV_PARSE_WORKERS
+        # store -> {article_id -> compact hash}, each store loaded on first use and kept in
+        # sync with DB writes; dropped when the DB's catalog generation moves on
+        self._hash_index = OrderedDict()
+        self._index_generation = None
+        self.hash_index_stores = CSV_HASH_INDEX_STORES
+        self.snapshot_dir = CSV_SNAPSHOT_DIR
+        if self.snapshot_dir:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+        # Stores whose snapshot no longer matches the DB (see save_snapshots)
+        self._stale_snapshots = set()
+        # Metrics, stage timings and changed stores of the last processed file
+        self.last_metrics = {}
+        self.last_timings = None
+        self.last_stores = set()
 
-    def _read_csv(self, file_path: str) -> list[dict]:
+    def _read_csv(self, file_path: str):
+        """
+        Lazily yield CSV rows as lists. The first item yielded is the header,
+        followed by every non-empty data row. Nothing is buffered beyond the
+        current row.
+        """
         with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
-            reader = csv.DictReader(f, delimiter=";")
-            return [row for row in reader if any(str(v).strip() for v in row.values())]
+            reader = csv.reader(f, delimiter=";")
+            header = next(reader, None)
+            if header is None:
+                return
+            yield header
+            for row in reader:
+                if any(v.strip() for v in row):
+                    yield row
+
+    def _parse_rows(self, header: list, rows, file_store: str):
+        return parse_rows(
+            header, rows, file_store, self.fingerprint_algo, self.hash_columns, self.store_column
+        )
+
+    def _parse_rows_parallel(self, file_path: str, header: list, file_store: str, workers: int):
+        """
+        Parse and hash a large CSV in worker processes, one byte range per task,
+        yielding rows in file order. At most 2 ranges per worker are buffered.
+        Ranges are cut at newlines, so quoted fields must not contain line breaks.
+        """
+        with open(file_path, "rb") as f:
+            f.readline()
+            data_start = f.tell()
+        ranges = split_byte_ranges(file_path, data_start, CSV_PARSE_RANGE_BYTES)
+        logger.info(
+            f"Parsing {os.path.basename(file_path)} in {len(ranges)} ranges with {workers} workers."
+        )
+
+        # spawn: the daemon has threads and open SQLite connections, which must not be forked
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        try:
+            window = deque()
+            for start, end in ranges:
+                window.append(
+                    pool.submit(
+                        _parse_range,
+                        file_path,
+                        start,
+                        end,
+                        header,
+                        file_store,
+                        self.fingerprint_algo,
+                        self.hash_columns,
+                        self.store_column,
+                    )
+                )
+                if len(window) >= workers * 2:
+                    yield from window.popleft().result()
+            while window:
+                yield from window.popleft().result()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _check_hash_index(self):
+        """Drop the hash index if another process rewrote the articles (snapshot import)."""
+        generation = self.db.catalog_generation()
+        if generation != self._index_generation:
+            if self._hash_index:
+                logger.info("Catalog was replaced since the hash index was loaded; reloading it.")
+            self._hash_index.clear()
+            self._index_generation = generation
+
+    def _store_index(self, store: str) -> dict:
+        """A store's {article_id: compact hash}, loaded on first use."""
+        store_index = self._hash_index.get(store)
+        if store_index is not None:
+            self._hash_index.move_to_end(store)
+            return store_index
+        store_index = self._hash_index[store] = self._load_store_index(store)
+        while self.hash_index_stores and len(self._hash_index) > self.hash_index_stores:
+            evicted, _ = self._hash_index.popitem(last=False)
+            logger.debug(f"Dropped hash index of store {evicted} (least recently used).")
+        return store_index
+
+    def _open_snapshot(self, store: str):
+        """The store's snapshot if it matches the DB, else None."""
+        path = snapshot_path(self.snapshot_dir, store)
+        if not os.path.exists(path):
+            return None
+        try:
+            snapshot = CatalogSnapshot(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+            return None
+        if self.db.snapshot_is_current(snapshot):
+            return snapshot
+        snapshot.close()
+        return None
+
+    def _load_store_index(self, store: str) -> dict:
+        """
+        Hash index of one store. With a snapshot directory, a current snapshot
+        is read from the memory-mapped file instead of the articles table;
+        otherwise the store is loaded from the DB and its snapshot written by
+        the next save_snapshots().
+        """
+        snapshot = self._open_snapshot(store) if self.snapshot_dir else None
+        if snapshot is not None:
+            with snapshot:
+                store_index = snapshot.hash_index()
+            source = "snapshot"
+        else:
+            store_index = self.db.load_hash_index(store).get(store, {})
+            source = "DB"
+            if self.snapshot_dir and store_index:
+                self._stale_snapshots.add(store)
+        logger.info(f"Loaded hash index of store {store} with {len(store_index)} articles from {source}.")
+        return store_index
+
+    def save_snapshots(self):
+        """
+        Export the snapshots of stores changed since they were last written.
+        Called while the loader is idle, so exports never delay an import.
+        """
+        while self.snapshot_dir and self._stale_snapshots:
+            store = self._stale_snapshots.pop()
+            try:
+                self.db.export_snapshot(snapshot_path(self.snapshot_dir, store), store)
+            except Exception as e:
+                logger.warning(f"Could not export snapshot of store {store}: {e}")
+
+    def diff_csv(self, file_path: str, snapshot: CatalogSnapshot) -> dict:
+        """
+        Compare a CSV with a store's snapshot without importing it. Returns
+        counts (rows of the snapshot's store, new, changed, unchanged, removed =
+        snapshot articles missing from the CSV, repeated = rows of articles
+        already seen, other_stores = rows of other stores) and the new_ids /
+        changed_ids. Like an import, the last row of a repeated article wins.
+        """
+        signature = fingerprint_signature(self.fingerprint_algo, self.hash_columns)
+        if snapshot.fingerprint != signature:
+            raise ValueError(
+                f"Snapshot fingerprint {snapshot.fingerprint} does not match the loader's {signature}"
+            )
+        result = {
+            "rows": 0, "new": 0, "changed": 0, "unchanged": 0, "removed": 0, "repeated": 0, "other_stores": 0
+        }
+        new_ids, changed_ids = [], []
+        # article_id -> hash of its last row, in order of first appearance
+        seen = {}
+        rows = self._read_csv(file_path)
+        header = next(rows, None)
+        if header is not None:
+            store = snapshot.store
+            for row in self._parse_rows(header, rows, store_from_filename(file_path)):
+                if row[6] != store:
+                    result["other_stores"] += 1
+                    continue
+                result["rows"] += 1
+                seen[row[0]] = compact_hash(row[5])
+        index = snapshot.hash_index()
+        for article_id, row_hash in seen.items():
+            current = index.get(article_id)
+            if current is None:
+                new_ids.append(article_id)
+            elif current != row_hash:
+                changed_ids.append(article_id)
+            else:
+                result["unchanged"] += 1
+        result["new"] = len(new_ids)
+        result["changed"] = len(changed_ids)
+        result["removed"] = sum(1 for article_id in index if article_id not in seen)
+        result["repeated"] = result["rows"] - len(seen)
+        result["new_ids"] = new_ids
+        result["changed_ids"] = changed_ids
+        return result
+
+    def _skip_unchanged(self, parsed_rows, metrics: dict, accepted: dict):
+        """
+        Yield only rows whose hash differs from the in-memory index.
+        accepted holds {(store, article_id): hash} of rows yielded but not yet
+        committed (the current batch), so a repeated article in the same batch
+        is compared with its earlier row instead of the DB state.
+        """
+        store, store_index = None, None
+        for row in parsed_rows:
+            metrics["rows"] += 1
+            key = (row[6], row[0])
+            row_hash = compact_hash(row[5])
+            current = accepted.get(key)
+            if current is None:
+                if row[6] != store:
+                    store, store_index = row[6], self._store_index(row[6])
+                current = store_index.get(row[0])
+            if current == row_hash:
+                metrics["skipped"] += 1
+                continue
+            accepted[key] = row_hash
+            yield row
 
     def _move_file(self, src: str, dst_dir: str, new_filename: str = None):
         """Move a file to a folder with optional new filename."""
@@ -41,32 +350,101 @@ class CSVLoader:
         shutil.move(src, dest_path)
         return dest_path
 
-    def process_csv(self, file_path: str) -> bool:
+    def process_csv(self, file_path: str, on_batch=None) -> bool:
+        """
+        Stream a CSV into the DB. on_batch(file_path, counts) is called after
+        each committed batch that inserted or updated articles.
+        Per-stage timings are kept in self.last_timings.
+        """
+        timer = self.last_timings = StageTimer()
+        self.last_stores = set()
         try:
             rows = self._read_csv(file_path)
-            if not rows:
+            header = next(rows, None)
+            if header is None:
                 logger.warning(f"No valid rows in CSV: {file_path}")
                 return False
+            # Per-row timing of the lazy read -> parse -> skip chain is opt-in
+            detailed = PROFILE_STAGES == "detailed"
+            if detailed:
+                rows = TimedIterator(rows)
 
-            success = False
-            for row in rows:
-                article_id = row.get("ArtikelNr", "").strip()
-                name = row.get("Bezeichnung", "").strip()
-                price_net = row.get("VKNetto1", "").strip()
-                price_gross = row.get("VKBrutto1", "").strip() if "VKBrutto1" in row else ""
-                ean = row.get("EAN1", "").strip() or ""
+            self._check_hash_index()
+            metrics = {"rows": 0, "skipped": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+            self.last_metrics = metrics
 
-                if not article_id:
-                    logger.warning(f"Skipping invalid row: {row}")
-                    continue
+            file_store = store_from_filename(file_path)
+            workers = self.parse_workers
+            parallel = workers > 1 and os.path.getsize(file_path) >= CSV_PARALLEL_MIN_BYTES
+            if parallel:
+                rows.close()
+                parsed_rows = self._parse_rows_parallel(file_path, header, file_store, workers)
+            else:
+                parsed_rows = self._parse_rows(header, rows, file_store)
+            if detailed:
+                parsed_rows = TimedIterator(parsed_rows)
+            accepted = {}
+            changed_rows = self._skip_unchanged(parsed_rows, metrics, accepted)
+            batches = TimedIterator(batched(changed_rows, CSV_BATCH_SIZE))
+            for batch in batches:
+                with timer.span("upsert", len(batch)):
+                    counts = self.db.upsert_articles(batch)
+                for key in ("inserted", "updated", "unchanged"):
+                    metrics[key] += counts[key]
+                # Only update the index once the batch is committed
+                with timer.span("hash_index_update", len(batch)):
+                    for (store, article_id), row_hash in accepted.items():
+                        # Stores dropped from the index meanwhile are reloaded on next use
+                        store_index = self._hash_index.get(store)
+                        if store_index is not None:
+                            store_index[article_id] = row_hash
+                    accepted.clear()
+                if counts["inserted"] or counts["updated"]:
+                    batch_stores = {row[6] for row in batch}
+                    self.last_stores |= batch_stores
+                    self._stale_snapshots |= batch_stores
+                if on_batch and (counts["inserted"] or counts["updated"]):
+                    # Blocks while the uploader queue is full (backpressure)
+                    with timer.span("upload_queue_wait"):
+                        on_batch(file_path, counts)
 
-                row_hash = self._generate_row_hash(row)
+            # Nested iterators: each stage's time excludes the stage it pulls from
+            if not detailed:
+                timer.add("read_parse_hash", batches.seconds, metrics["rows"])
+            elif parallel:
+                timer.add("parse_hash_parallel", parsed_rows.seconds, parsed_rows.items)
+            else:
+                timer.add("read_csv", rows.seconds, rows.items)
+                timer.add("parse_hash", parsed_rows.seconds - rows.seconds, parsed_rows.items)
+            if detailed:
+                timer.add("skip_unchanged", batches.seconds - parsed_rows.seconds, metrics["rows"])
 
-                self.db.upsert_article(article_id, name, price_net, price_gross, ean, row_hash)
-                success = True
+            if not metrics["rows"]:
+                logger.warning(f"No valid rows in CSV: {file_path}")
+                return False
 
-            return success
+            metrics["delta_ratio"] = round(
+                (metrics["inserted"] + metrics["updated"]) / metrics["rows"], 4
+            )
+            logger.info(
+                f"CSV {os.path.basename(file_path)}: {metrics['rows']} rows, "
+                f"{metrics['skipped']} skipped (unchanged in index), "
+                f"{metrics['inserted']} inserted, {metrics['updated']} updated, "
+                f"{metrics['unchanged']} unchanged, delta ratio {metrics['delta_ratio']:.2%}"
+            )
+            for key, result in (
+                ("rows", "parsed"),
+                ("skipped", "skipped"),
+                ("inserted", "inserted"),
+                ("updated", "updated"),
+                ("unchanged", "unchanged"),
+            ):
+                CSV_ROWS.inc(metrics[key], result=result)
+                CSV_LAST_FILE_ROWS.set(metrics[key], result=result)
+            return True
 
         except Exception as e:
             logger.error(f"Error processing CSV {file_path}: {e}")
+            # Index may be out of sync with the DB after a failure; reload next time
+            self._hash_index.clear()
             return False
@@ -0,0 +1,206 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+from modules.common.common import set_logger
+
+logger = set_logger()
+
+# auto (inotify on Linux, else polling), inotify or poll
+WATCH_MODE = os.getenv("WATCH_MODE", "auto").lower()
+# A file is processed once it saw no writes for this many seconds
+WATCH_DEBOUNCE = float(os.getenv("WATCH_DEBOUNCE", "0.5"))
+# Directory scan interval in polling mode (seconds)
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "1"))
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+# O_* flags only exist on Unix; inotify is only used on Linux
+IN_NONBLOCK = getattr(os, "O_NONBLOCK", 0)
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal ctypes wrapper around Linux inotify for one directory."""
+
+    def __init__(self, path: str, mask: int):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed for {path}")
+
+    def read(self, timeout: float):
+        """Wait up to timeout seconds; return list of (mask, name) events."""
+        readable, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append((mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class InputWatcher:
+    """
+    Waits for CSV files in the input folder.
+    Uses inotify close-write / moved-to events where available and falls back
+    to polling the folder. A file is only handed out after it saw no changes
+    for `debounce` seconds, so partially written files are not picked up.
+    """
+
+    def __init__(
+        self,
+        input_dir: str,
+        extension: str = ".csv",
+        mode: str = WATCH_MODE,
+        debounce: float = WATCH_DEBOUNCE,
+        poll_interval: float = WATCH_POLL_INTERVAL,
+    ):
+        self.input_dir = input_dir
+        self.extension = extension.lower()
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        # name -> (signature, time of last change)
+        self._pending = {}
+        # name -> signature of files already handed out
+        self._handed_out = {}
+        self._inotify = None
+
+        if mode in ("auto", "inotify") and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify(input_dir, IN_CLOSE_WRITE | IN_MOVED_TO)
+            except OSError as e:
+                if mode == "inotify":
+                    raise
+                logger.warning(f"inotify unavailable ({e}), falling back to polling.")
+        elif mode == "inotify":
+            raise OSError("inotify is only available on Linux")
+
+        self.mode = "inotify" if self._inotify else "poll"
+        self._scan()
+        logger.info(f"Watching {input_dir} for *{extension} files ({self.mode} mode).")
+
+    def _signature(self, name: str):
+        try:
+            st = os.stat(os.path.join(self.input_dir, name))
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def _touch(self, name: str, now: float):
+        """Record activity on a file (new, modified or written by an event)."""
+        signature = self._signature(name)
+        if signature is None:
+            self._pending.pop(name, None)
+            return
+        if self._handed_out.get(name) == signature:
+            return
+        self._handed_out.pop(name, None)
+        current = self._pending.get(name)
+        if current is None or current[0] != signature:
+            self._pending[name] = (signature, now)
+
+    def _scan(self):
+        now = time.monotonic()
+        names = [
+            f for f in os.listdir(self.input_dir) if f.lower().endswith(self.extension)
+        ]
+        for name in names:
+            self._touch(name, now)
+        present = set(names)
+        for name in list(self._pending):
+            if name not in present:
+                del self._pending[name]
+        for name in list(self._handed_out):
+            if name not in present:
+                del self._handed_out[name]
+
+    def _collect_ready(self) -> list[str]:
+        now = time.monotonic()
+        ready = []
+        for name, (signature, changed_at) in list(self._pending.items()):
+            if now - changed_at < self.debounce:
+                continue
+            current = self._signature(name)
+            if current is None:
+                del self._pending[name]
+            elif current != signature:
+                self._pending[name] = (current, now)
+            else:
+                ready.append(name)
+        for name in ready:
+            self._handed_out[name] = self._pending.pop(name)[0]
+        # Oldest first (arrival order)
+        ready.sort(key=lambda name: (self._handed_out[name][1], name))
+        return ready
+
+    def _next_wake(self, deadline: float) -> float:
+        now = time.monotonic()
+        wake = deadline
+        if self._pending:
+            wake = min(wake, min(t for _, t in self._pending.values()) + self.debounce)
+        if not self._inotify:
+            wake = min(wake, now + self.poll_interval)
+        return max(wake - now, 0)
+
+    def wait(self, timeout: float) -> list[str]:
+        """
+        Block until at least one CSV file is ready or timeout seconds pass.
+        Returns ready file names (oldest first). After a timeout, files that
+        were handed out before but are still present are offered again.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            ready = self._collect_ready()
+            if ready:
+                return ready
+
+            if time.monotonic() >= deadline:
+                self._handed_out.clear()
+                self._scan()
+                return []
+
+            sleep_for = self._next_wake(deadline)
+            if self._inotify:
+                events = self._inotify.read(sleep_for)
+                now = time.monotonic()
+                for mask, name in events:
+                    if mask & IN_Q_OVERFLOW:
+                        self._scan()
+                    elif name.lower().endswith(self.extension):
+                        self._touch(name, now)
+            else:
+                time.sleep(sleep_for)
+                self._scan()
+
+    def close(self):
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
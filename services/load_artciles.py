@@ -1,103 +1,233 @@
 import os
 import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor
 from modules.aims_saas.aims_saas_api_client import AIMSSaaSAPIClient
+from modules.aims_saas.adaptive_upload import RETRYABLE_STATUS, RateLimiter, backoff_delay
+from modules.aims_saas.payload import encode_rows
 from modules.common.common import set_logger
+from modules.common.metrics import (
+    AIMS_CHUNK_CEILING_BYTES,
+    AIMS_CHUNK_GROWS,
+    AIMS_CHUNK_SHRINKS,
+    AIMS_CHUNK_TARGET_BYTES,
+    AIMS_SYNC_SECONDS,
+)
+from modules.common.profiling import StageTimer, TimedIterator, cycle_profile_pending, profile_once
+from modules.common.stores import DEFAULT_STORE
 
 logger = set_logger()
 
-STORE_ID = os.getenv("AIMS_SAAS_STORE", "KL001")
+# Default store (rows of CSVs without store routing)
+STORE_ID = DEFAULT_STORE
 COMPANY_ID = os.getenv("AIMS_SAAS_COMPANY", "KIM")
+# Pending articles read from the DB per page (split into upload chunks)
+AIMS_SYNC_PAGE_SIZE = int(os.getenv("AIMS_SYNC_PAGE_SIZE", "20000"))
+AIMS_SAAS_CHUNK_SIZE = int(os.getenv("AIMS_SAAS_CHUNK_SIZE", "5000"))
+# Stores synced in parallel (each uploads up to AIMS_SAAS_MAX_IN_FLIGHT chunks at once)
+AIMS_SYNC_STORE_WORKERS = int(os.getenv("AIMS_SYNC_STORE_WORKERS", "4"))
+# Max article upload requests per second and store (0 = unlimited)
+AIMS_STORE_MAX_RPS = float(os.getenv("AIMS_STORE_MAX_RPS", "0"))
 
 
 class AIMSSyncService:
-    """Sync pending articles to AIMS SaaS."""
+    """
+    Sync pending articles to AIMS SaaS.
+    Stores with pending articles are synced in parallel by a small worker
+    pool; uploads of each store are rate limited separately.
+    """
 
     def __init__(self, db, failed_dir: str):
         self.db = db
         self.failed_dir = failed_dir
         os.makedirs(self.failed_dir, exist_ok=True)
 
-        self.client = AIMSSaaSAPIClient()
+        # One upload per store worker at a time, each with up to AIMS_SAAS_MAX_IN_FLIGHT chunks
+        self.client = AIMSSaaSAPIClient(concurrent_uploads=max(AIMS_SYNC_STORE_WORKERS, 1))
         logger.info("AIMS SaaS client initialized.")
-
-    def _prepare_articles_payload(self, rows):
+        sizer = self.client.chunk_sizer
+        for metric, key in (
+            (AIMS_CHUNK_TARGET_BYTES, "target_bytes"),
+            (AIMS_CHUNK_CEILING_BYTES, "ceiling_bytes"),
+            (AIMS_CHUNK_GROWS, "grows"),
+            (AIMS_CHUNK_SHRINKS, "shrinks"),
+        ):
+            metric.set_function(lambda key=key: sizer.metrics()[key])
+
+        # Long-lived workers, so each keeps its pooled DB connection
+        self._store_pool = ThreadPoolExecutor(
+            max_workers=max(AIMS_SYNC_STORE_WORKERS, 1), thread_name_prefix="aims-store"
+        )
+        self._rate_limiters = {}
+        # Stage timings of the running / last sync_stores call
+        self._timer = StageTimer()
+        self.last_timings = None
+
+    def close(self):
+        self._store_pool.shutdown(wait=True)
+        self.client.close()
+
+    def _rate_limiter(self, store):
+        if AIMS_STORE_MAX_RPS <= 0:
+            return None
+        limiter = self._rate_limiters.get(store)
+        if limiter is None:
+            limiter = self._rate_limiters[store] = RateLimiter(AIMS_STORE_MAX_RPS)
+        return limiter
+
+    def _prepare_articles_payload(self, rows, store=STORE_ID):
         """
-        rows: list of tuples (article_id, Bezeichnung, VKNetto1, VKBrutto1, ean)
+        rows: list of tuples (article_id, Bezeichnung, VKNetto1, VKBrutto1, ean, change_seq)
+        Returns the articles serialized for upload (EncodedArticles).
         """
-        articles = []
-
-        for article_id, name, vknetto, vkbrutto, ean in rows:
-            data_fields = {
-                "STORE_ID": STORE_ID,
-                "ArtikelNr": article_id,
-                "Bezeichnung": name,
-                "VKNetto1": vknetto,
-                "VKBrutto1": vkbrutto,
-                "EAN1": ean or "",
-            }
-
-            articles.append(
-                {
-                    "store": STORE_ID,
-                    "articleId": article_id,
-                    "articleName": name,
-                    "eans": [ean] if ean else [],
-                    "data": data_fields,
-                }
+        return encode_rows(rows, store)
+
+    def _mark_chunk_sent(self, chunk_result):
+        """Checkpoint: mark a chunk's articles as sent as soon as AIMS accepts it."""
+        if not chunk_result.ok:
+            return
+        # EncodedArticles keys: (article_id, change_seq, store)
+        sent_rows = chunk_result.articles
+        if not sent_rows:
+            return
+        with self._timer.span("mark_sent", len(sent_rows)):
+            marked = self.db.mark_aims_sent_versions(sent_rows)
+        store = sent_rows[0][2]
+        logger.info(f"Marked {marked} articles of store {store} as synced.")
+        if marked < len(sent_rows):
+            logger.info(
+                f"{len(sent_rows) - marked} articles of store {store} changed during upload, kept pending."
             )
 
-        return articles
-
-    def _send_payload(self, articles):
+    def _send_payload(self, articles, store=STORE_ID):
+        """
+        Upload articles chunk by chunk. Accepted chunks are marked as sent
+        immediately; only failed chunks are retried.
+        """
         max_attempts = 5
         attempt = 1
 
         while attempt <= max_attempts:
             try:
-                response = self.client.add_articles(STORE_ID, articles, 5000)
+                with self._timer.span("add_articles", len(articles)):
+                    result = self.client.add_articles(
+                        store,
+                        articles,
+                        AIMS_SAAS_CHUNK_SIZE,
+                        on_chunk_done=self._mark_chunk_sent,
+                        rate_limiter=self._rate_limiter(store),
+                    )
 
-                if getattr(response, "status_code", None) in (200, 202):
+                if result.ok:
                     return True
 
-                if getattr(response, "status_code", None) == 401:
+                failed = result.failed
+                articles = articles.select(failed)
+                retryable = all(chunk.status_code in RETRYABLE_STATUS for chunk in failed)
+
+                if not retryable:
+                    # Other errors
+                    logger.error(f"AIMS SaaS error for store {store}: {result.text}")
+                    return False
+
+                if all(chunk.status_code == 401 for chunk in failed):
+                    # The client dropped the rejected token; retry right away with a new one
                     logger.info(
-                        f"Attempt {attempt}: Token expired or unauthorized. Refreshing..."
+                        f"Store {store}, attempt {attempt}: access token rejected, retrying with a new token"
                     )
-                    attempt += 1
-                    time.sleep(1)
-                    continue  # retry once
-
-                # Other errors
-                logger.error(f"AIMS SaaS error: {getattr(response, 'text', repr(response))}")
-                return False
+                else:
+                    logger.warning(
+                        f"Store {store}, attempt {attempt}: {len(failed)} of {len(result.chunks)} chunks failed, "
+                        f"retrying {len(articles)} articles"
+                    )
+                    with self._timer.span("backoff"):
+                        time.sleep(backoff_delay(attempt, result.retry_after))
+                attempt += 1
 
             except Exception as e:
-                logger.error(f"AIMS SaaS API call failed on attempt {attempt}: {e}")
+                logger.error(f"AIMS SaaS API call for store {store} failed on attempt {attempt}: {e}")
+                with self._timer.span("backoff"):
+                    time.sleep(backoff_delay(attempt))
                 attempt += 1
-                time.sleep(1)
 
-        logger.error("Failed to send articles after 5 attempts.")
+        logger.error(
+            f"Failed to send {len(articles)} articles of store {store} after {max_attempts} attempts."
+        )
         return False
 
-    def sync_all_pending_articles(self):
+    def _sync_store(self, store):
+        """Send one store's pending articles page by page. Returns (success, sent)."""
+        sent = 0
+        fetched = 0
+        pages = TimedIterator(self.db.iter_pending_for_aims(AIMS_SYNC_PAGE_SIZE, store))
+        try:
+            for rows in pages:
+                fetched += len(rows)
+                with self._timer.span("prepare_payload", len(rows)):
+                    articles_payload = self._prepare_articles_payload(rows, store)
+                if not self._send_payload(articles_payload, store):
+                    logger.error(f"Failed to send articles of store {store} to AIMS API.")
+                    return False, sent
+                sent += len(rows)
+        except Exception as e:
+            logger.error(f"Unexpected error syncing store {store}: {e}")
+            return False, sent
+        finally:
+            self._timer.add("db_pending", pages.seconds, fetched, calls=pages.items)
+        logger.info(f"Store {store}: {sent} articles synced.")
+        return True, sent
+
+    def sync_stores(self) -> dict:
+        """
+        Send all pending articles, stores in parallel.
+        Returns {store: (success, number of articles sent)} for every store
+        that had pending articles ({} if nothing was pending).
+        """
         logger.info("Checking DB for pending article updates...")
-        rows = self.db.get_pending_for_aims()
-        if not rows:
+        timer = self._timer = self.last_timings = StageTimer()
+        with timer.span("pending_stores") as span:
+            stores = self.db.pending_stores()
+            span.items = len(stores)
+        if not stores:
             logger.info("No pending articles.")
-            return False  # indicate sync did not succeed
+            return {}
 
-        articles_payload = self._prepare_articles_payload(rows)
-        success = self._send_payload(articles_payload)
-
-        if success:
-            article_ids = [r[0] for r in rows]
-            self.db.mark_aims_sent(article_ids)
-            logger.info(f"Marked {len(article_ids)} articles as synced.")
+        start = time.perf_counter()
+        if cycle_profile_pending("sync"):
+            # cProfile only sees the calling thread: sync the stores one by one this time
+            with profile_once("sync"):
+                outcomes = [self._sync_store(store) for store in stores]
         else:
-            logger.error("Failed to send articles to AIMS API.")
+            outcomes = list(self._store_pool.map(self._sync_store, stores))
+        results = dict(zip(stores, outcomes))
+        failed = [store for store, (ok, _) in results.items() if not ok]
+        AIMS_SYNC_SECONDS.observe(
+            time.perf_counter() - start, result="failed" if failed else "success"
+        )
+        if failed:
+            logger.error(f"AIMS sync failed for {len(failed)} of {len(stores)} stores: {', '.join(failed)}")
+
+        sizing = self.client.chunk_sizer.metrics()
+        logger.info(
+            f"Upload chunk target now {sizing['target_bytes']} bytes "
+            f"({sizing['grows']} grows, {sizing['shrinks']} shrinks)"
+        )
+        return results
+
+    def sync_pending(self):
+        """
+        Send all pending articles (see sync_stores).
+        Returns (success, number of articles sent); success only if every
+        store synced. (True, 0) if nothing was pending.
+        """
+        results = self.sync_stores()
+        sent = sum(count for _, count in results.values())
+        return all(ok for ok, _ in results.values()), sent
 
-        return success
+    def sync_all_pending_articles(self):
+        success, sent = self.sync_pending()
+        # no pending articles indicates the sync did not succeed
+        return success and sent > 0
 
     def _move_to_failed(self, file_path):
         """Move file to failed folder if AIMS sync fails."""
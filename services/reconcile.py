@@ -0,0 +1,143 @@
+import os
+import time
+import threading
+from modules.aims_saas.adaptive_upload import RETRYABLE_STATUS, backoff_delay
+from modules.aims_saas.aims_saas_api_client import AIMS_SAAS_LIST_PAGE_SIZE
+from modules.aims_saas.payload import article_digest, synced_digest
+from modules.common.common import set_logger
+
+logger = set_logger()
+
+# Run the reconciliation every this many hours from the daemon (0 = only on demand)
+AIMS_RECONCILE_INTERVAL_HOURS = float(os.getenv("AIMS_RECONCILE_INTERVAL_HOURS", "0"))
+# Synced articles read from the DB per page
+AIMS_RECONCILE_PAGE_SIZE = int(os.getenv("AIMS_RECONCILE_PAGE_SIZE", "20000"))
+# Attempts per AIMS listing page before a store's reconciliation is given up
+AIMS_RECONCILE_MAX_ATTEMPTS = 5
+
+
+class AIMSReconciler:
+    """
+    Compares the articles AIMS holds with the ones the DB marks as synced
+    and flags differing or missing ones for upload again (aims_flag=1).
+    Articles are compared by a digest of the uploaded fields; AIMS is read
+    through its paged article listing instead of one request per article.
+    Pending articles are left out, the next sync sends them anyway.
+    """
+
+    def __init__(self, db, client):
+        self.db = db
+        self.client = client
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _remote_pages(self, store, page_size=AIMS_SAAS_LIST_PAGE_SIZE):
+        """AIMS article pages of a store, each page retried on transient errors."""
+        page = 0
+        while True:
+            attempt = 1
+            while True:
+                try:
+                    data = self.client.list_articles(store, page, page_size)
+                    break
+                except Exception as e:
+                    status = getattr(getattr(e, "response", None), "status_code", None)
+                    if attempt >= AIMS_RECONCILE_MAX_ATTEMPTS or status not in RETRYABLE_STATUS:
+                        raise
+                    logger.warning(f"Listing store {store} page {page} failed (attempt {attempt}): {e}")
+                    time.sleep(backoff_delay(attempt))
+                    attempt += 1
+            articles = data.get("articleList") or []
+            if not articles:
+                return
+            yield articles
+            page += 1
+            total_pages = data.get("totalPages")
+            if total_pages is not None:
+                # AIMS may cap the page size below page_size, so short pages do not mean the end
+                if page >= total_pages:
+                    return
+            elif len(articles) < page_size:
+                return
+
+    def reconcile_store(self, store: str, dry_run: bool = False) -> dict:
+        """
+        Reconcile one store. Returns counts: local (synced articles in the DB),
+        remote, matched, mismatched, missing (not in AIMS), extra (only in
+        AIMS or still pending here) and flagged.
+        """
+        start = time.perf_counter()
+        local = {}
+        for rows in self.db.iter_synced_for_aims(AIMS_RECONCILE_PAGE_SIZE, store):
+            for row in rows:
+                local[row[0]] = synced_digest(*row)
+        counts = {"store": store, "local": len(local), "remote": 0, "matched": 0, "mismatched": 0, "extra": 0}
+
+        mismatched = []
+        for articles in self._remote_pages(store):
+            counts["remote"] += len(articles)
+            for article in articles:
+                digest = local.pop(article.get("articleId"), None)
+                if digest is None:
+                    counts["extra"] += 1
+                elif digest == article_digest(article):
+                    counts["matched"] += 1
+                else:
+                    mismatched.append(article.get("articleId"))
+        # Whatever AIMS did not list is missing there
+        missing = list(local)
+        counts["mismatched"] = len(mismatched)
+        counts["missing"] = len(missing)
+
+        flagged = 0
+        if not dry_run:
+            flagged = self.db.flag_for_aims(mismatched + missing, store)
+        counts["flagged"] = flagged
+        counts["seconds"] = round(time.perf_counter() - start, 2)
+        logger.info(
+            f"Reconciled store {store}{' (dry run)' if dry_run else ''}: {counts['local']} synced locally, "
+            f"{counts['remote']} in AIMS, {counts['mismatched']} differ, {counts['missing']} missing, "
+            f"{counts['extra']} only in AIMS, {flagged} flagged for upload in {counts['seconds']} s"
+        )
+        return counts
+
+    def reconcile(self, stores: list = None, dry_run: bool = False) -> list:
+        """Reconcile the given stores (default: all stores in the DB). Failed stores are skipped."""
+        results = []
+        for store in stores or self.db.stores():
+            if self._stop.is_set():
+                break
+            try:
+                results.append(self.reconcile_store(store, dry_run))
+            except Exception as e:
+                logger.error(f"Reconciliation of store {store} failed: {e}")
+                results.append({"store": store, "error": str(e)})
+        return results
+
+    def start(self, on_flagged=None) -> bool:
+        """
+        Reconcile all stores on a background thread, so the daemon keeps
+        picking up CSVs meanwhile. on_flagged() is called afterwards if any
+        articles were flagged. Returns False if a run is still going on.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return False
+
+        def run():
+            try:
+                results = self.reconcile()
+            finally:
+                # One thread per run: do not leave its DB connection in the pool
+                self.db.release_connection()
+            if on_flagged and not self._stop.is_set() and any(r.get("flagged") for r in results):
+                on_flagged()
+
+        self._thread = threading.Thread(target=run, name="aims-reconcile", daemon=True)
+        self._thread.start()
+        return True
+
+    def close(self, timeout: float = None):
+        """Stop a background run after the store being reconciled."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,192 @@
+import os
+import queue
+import threading
+from modules.common.common import set_logger
+from modules.common.metrics import AIMS_PENDING_ARTICLES, PIPELINE_QUEUE_DEPTH
+from modules.common.profiling import merge_summaries, profile_once
+
+logger = set_logger()
+
+# Max DB batches / finished files waiting for the uploader (backpressure)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+
+# File outcomes passed to on_file_done
+FILE_SYNCED = "synced"
+FILE_SYNC_FAILED = "sync_failed"
+FILE_INVALID = "invalid"
+FILE_ERROR = "error"
+
+_BATCH = "batch"
+_SYNC = "sync"
+_FILES_DONE = "files_done"
+_STOP = "stop"
+
+
+class SyncPipeline:
+    """
+    Overlaps CSV parsing with AIMS uploads.
+    The calling thread parses and upserts CSV files (producer); a background
+    uploader thread syncs pending articles whenever a DB batch was committed
+    (consumer). A bounded queue between them provides backpressure.
+    Everything queued while a sync runs is covered by the next single sync.
+    Each file is finalized through on_file_done(file_path, outcome, report)
+    once the sync following its last batch finished; report holds the
+    file's ingest metrics and stage timings and those of that sync. A file
+    only fails the sync if one of the stores its rows changed failed.
+    """
+
+    def __init__(self, csv_loader, aims_sync, on_file_done, queue_size=PIPELINE_QUEUE_SIZE):
+        self.csv_loader = csv_loader
+        self.aims_sync = aims_sync
+        self.on_file_done = on_file_done
+        self._queue = queue.Queue(maxsize=queue_size)
+        PIPELINE_QUEUE_DEPTH.set_function(self._queue.qsize)
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        # Timing summaries of the syncs since files were last finalized (uploader thread only)
+        self._sync_summaries = []
+        self._thread = threading.Thread(
+            target=self._run_uploader, name="aims-uploader", daemon=True
+        )
+        self._thread.start()
+
+    def is_in_flight(self, file_path: str) -> bool:
+        with self._lock:
+            return file_path in self._in_flight
+
+    def _ingest(self, file_path: str, on_batch=None) -> bool:
+        try:
+            return self.csv_loader.process_csv(file_path, on_batch=on_batch)
+        except Exception as e:
+            logger.error(f"Error processing CSV {file_path}: {e}")
+            return False
+
+    def submit(self, file_path: str):
+        """Parse and upsert one CSV on this thread; uploads run in the background."""
+        self.submit_files([file_path])
+
+    def submit_files(self, file_paths: list):
+        """
+        Parse and upsert CSV files in the given (arrival) order, then queue a
+        single sync for all of them. Later files win for the same article.
+        A lone file also triggers syncs per committed batch so large feeds
+        upload while they are still being parsed; in a burst of files those
+        are skipped so an article changed by several files is sent once.
+        """
+        with self._lock:
+            self._in_flight.update(file_paths)
+
+        def on_batch(path, counts):
+            self._queue.put((_BATCH,))
+
+        results = []
+        with profile_once("ingest"):
+            for file_path in file_paths:
+                logger.info(f"Processing CSV file: {os.path.basename(file_path)}")
+                ok = self._ingest(file_path, on_batch if len(file_paths) == 1 else None)
+                timings = self.csv_loader.last_timings
+                ingest = {
+                    "metrics": dict(self.csv_loader.last_metrics),
+                    **(timings.summary() if timings else {}),
+                }
+                results.append((file_path, ok, ingest, set(self.csv_loader.last_stores)))
+        self._queue.put((_FILES_DONE, results))
+
+    def request_sync(self):
+        """Sync pending articles on the uploader thread (e.g. after articles were re-flagged)."""
+        self._queue.put((_SYNC,))
+
+    def _update_pending_gauge(self):
+        """
+        Count pending articles on the uploader thread. Scrapes only read the
+        gauge: they run on short-lived threads that must not use the DB pool.
+        """
+        try:
+            AIMS_PENDING_ARTICLES.set(self.aims_sync.db.count_pending_for_aims())
+        except Exception as e:
+            logger.debug(f"Could not count pending articles: {e}")
+
+    def _sync(self):
+        """Returns (outcome, stores that failed); outcome is FILE_ERROR if the sync itself raised."""
+        try:
+            results = self.aims_sync.sync_stores()
+            return FILE_SYNCED, {store for store, (ok, _) in results.items() if not ok}
+        except Exception as e:
+            logger.error(f"Unexpected error during sync: {e}")
+            return FILE_ERROR, set()
+        finally:
+            timings = getattr(self.aims_sync, "last_timings", None)
+            if timings:
+                self._sync_summaries.append(timings.summary())
+            self._update_pending_gauge()
+
+    def _finish_file(self, file_path, outcome, report):
+        try:
+            self.on_file_done(file_path, outcome, report)
+        except Exception as e:
+            logger.error(f"Error finalizing CSV {file_path}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(file_path)
+
+    def _run_uploader(self):
+        self._update_pending_gauge()
+        while True:
+            # Coalesce everything that piled up while the last sync ran
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(item[0] == _STOP for item in items)
+            files = [result for item in items if item[0] == _FILES_DONE for result in item[1]]
+            batches = any(item[0] == _BATCH for item in items)
+            needs_sync = batches or any(ok for _, ok, _, _ in files)
+            requested = any(item[0] == _SYNC for item in items)
+
+            outcome, failed_stores = FILE_SYNCED, set()
+            sync = None
+            if needs_sync:
+                names = ", ".join(os.path.basename(path) for path, ok, _, _ in files if ok)
+                logger.info(f"Syncing articles from CSV: {names or 'committed batches'}")
+                outcome, failed_stores = self._sync()
+            elif requested:
+                logger.info("Syncing articles on request")
+                summaries = len(self._sync_summaries)
+                self._sync()
+                # not caused by any file, keep it out of the file timing reports
+                del self._sync_summaries[summaries:]
+
+            if files:
+                # Batch syncs during ingest count towards the files finalized now
+                sync = {
+                    "files": [os.path.basename(path) for path, _, _, _ in files],
+                    "syncs": len(self._sync_summaries),
+                    **merge_summaries(self._sync_summaries),
+                }
+                self._sync_summaries = []
+
+            for file_path, ok, ingest, stores in files:
+                if not ok:
+                    file_outcome = FILE_INVALID
+                elif outcome == FILE_SYNCED and stores & failed_stores:
+                    file_outcome = FILE_SYNC_FAILED
+                else:
+                    file_outcome = outcome
+                report = {
+                    "file": os.path.basename(file_path),
+                    "outcome": file_outcome,
+                    "ingest": ingest,
+                    "sync": sync if ok else None,
+                }
+                self._finish_file(file_path, file_outcome, report)
+
+            if stop:
+                return
+
+    def close(self, timeout: float = None):
+        """Finish queued work and stop the uploader thread."""
+        self._queue.put((_STOP,))
+        self._thread.join(timeout)